@@ -0,0 +1,82 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/bench_extractors.py
+"""
+HTMLの本文抽出エンジン (chapter_009/src/extractors.py) の速度と品質を比較するベンチマーク
+
+benchmarks/corpus/ に保存したHTMLページを使うのでネットワークには接続しない
+品質は corpus/expected.json に書いた以下の2つで評価する
+- recall: 本文に含まれるべきフレーズのうち、抽出結果に含まれていた割合 (高いほど良い)
+- leak: 本文ではないフレーズ (ナビゲーション・広告など) のうち、抽出結果に含まれていた割合 (低いほど良い)
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/bench_extractors.py --repeat 50
+    python benchmarks/bench_extractors.py --inflate 20  # 各ページの本文を20倍にした大きなページでも計測
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, "corpus")
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "chapter_009"))
+from src.extractors import EXTRACTORS  # noqa: E402
+
+
+def load_corpus(inflate=1):
+    with open(os.path.join(CORPUS_DIR, "expected.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    corpus = {}
+    for file_name in expected:
+        with open(os.path.join(CORPUS_DIR, file_name), "r", encoding="utf-8") as f:
+            html = f.read()
+        if inflate > 1:
+            # 本文の段落を繰り返して大きなページを作る
+            html = re.sub(r"(<p>.*?</p>)", lambda m: m.group(1) * inflate, html, flags=re.S)
+        corpus[file_name] = html
+    return corpus, expected
+
+
+def score(content, expected):
+    include, exclude = expected["must_include"], expected["must_exclude"]
+    recall = sum(phrase in content for phrase in include) / len(include)
+    leak = sum(phrase in content for phrase in exclude) / len(exclude)
+    return recall, leak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--inflate", type=int, default=1, help="本文の段落を何倍に増やすか")
+    parser.add_argument("--show", help="指定したエンジンの抽出結果を表示する")
+    args = parser.parse_args()
+
+    corpus, expected = load_corpus(args.inflate)
+    total_bytes = sum(len(html.encode("utf-8")) for html in corpus.values())
+    print(f"corpus: {len(corpus)} pages, {total_bytes / 1024:.1f} KB (x{args.repeat})\n")
+    print(f"{'engine':>12} {'pages/sec':>10} {'MB/sec':>8} {'recall':>7} {'leak':>6} {'chars':>7}")
+
+    for engine, extract in EXTRACTORS.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results = {name: extract(html) for name, html in corpus.items()}
+        elapsed = time.perf_counter() - start
+
+        scores = [score(content, expected[name]) for name, (_, content) in results.items()]
+        recall = sum(s[0] for s in scores) / len(scores)
+        leak = sum(s[1] for s in scores) / len(scores)
+        chars = sum(len(content) for _, content in results.values())
+        print(f"{engine:>12} {len(corpus) * args.repeat / elapsed:>10.1f} "
+              f"{total_bytes * args.repeat / elapsed / 1024 / 1024:>8.2f} "
+              f"{recall:>7.2f} {leak:>6.2f} {chars:>7}")
+
+        if engine == args.show:
+            for name, (title, content) in results.items():
+                print(f"\n===== {name}: {title}\n{content}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/bench_http_pool.py
+"""
+fetch_page の HTTP 通信を、素の requests.get と共有コネクションプールで比較するベンチマーク
+
+ローカルのスタブサーバーを使い、新しい接続ごとに `--connect-delay` 秒の待ち時間を入れて
+TCP/TLS ハンドシェイクのコストを模擬する
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/bench_http_pool.py --requests 50 --threads 4 --connect-delay 0.05
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stub_server import StubServer, sample_page
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chapter_009"))
+from src.http_client import get_session, get_timeout  # noqa: E402
+
+
+def run(fetch, urls, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for response in executor.map(fetch, urls):
+            response.content  # body を最後まで読んで接続をプールに返す
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--connect-delay", type=float, default=0.05,
+                        help="新しい接続ごとにサーバー側で待つ秒数 (ハンドシェイクの模擬)")
+    args = parser.parse_args()
+
+    body = sample_page().encode("utf-8")
+    routes = {"/page": (200, {"Content-Type": "text/html; charset=utf-8"}, body)}
+    with StubServer(routes, connect_delay_sec=args.connect_delay) as server:
+        urls = [server.url("/page")] * args.requests
+
+        elapsed = run(lambda url: requests.get(url, timeout=10), urls, args.threads)
+        bare_connections = server.connection_count
+        print(f"requests.get:    {elapsed:.3f}s ({args.requests / elapsed:.1f} req/s, "
+              f"{bare_connections} connections)")
+
+        elapsed = run(lambda url: get_session().get(url, timeout=get_timeout()), urls, args.threads)
+        pooled_connections = server.connection_count - bare_connections
+        print(f"pooled session:  {elapsed:.3f}s ({args.requests / elapsed:.1f} req/s, "
+              f"{pooled_connections} connections)")
+
+
+if __name__ == '__main__':
+    main()
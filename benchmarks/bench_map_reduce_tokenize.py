@@ -0,0 +1,93 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/bench_map_reduce_tokenize.py
+"""
+YouTube 要約 (chapter_005/part2/map_reduce.py) の前処理にかかるCPU時間を比較するベンチマーク
+
+数時間の動画の字幕を想定した長いテキストで、LLMに渡す前のトークン化の処理だけを計測する
+
+- これまで: ルーティングでトークン数を数え、分割でもう一度トークン化し、
+           map の流量制限のために各チャンクのトークン数をさらに数え直す
+- 1回のトークン化: 全体を1回だけトークン化し、ルーティング・分割・流量制限で使い回す
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/bench_map_reduce_tokenize.py --hours 1 3 6
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chapter_005", "part2"))
+from src.text_splitter import count_tokens, encode, split_text, split_tokens  # noqa: E402
+
+CHUNK_SIZE = 16000
+
+# 字幕は行の区切りがなく、発話がスペースでつながった1つの長いテキストになる
+ENGLISH_UTTERANCES = [
+    "so today we're going to talk about how to build applications with large language models",
+    "the first thing you need is an API key",
+    "and once you have that you can start calling the model from Python",
+    "let's look at the pricing because that's usually the first question people ask",
+    "input tokens and output tokens are billed separately",
+]
+JAPANESE_UTTERANCES = [
+    "はいどうもこんにちは今日は大規模言語モデルを使ったアプリケーションの作り方についてお話しします",
+    "まず最初に必要になるのはAPIキーです",
+    "キーを取得したらPythonからモデルを呼び出してみましょう",
+    "料金についてもよく質問をいただくので説明しておきます",
+    "入力と出力のトークンはそれぞれ別に課金されます",
+]
+# 1分あたりの発話数 (英語で約150語/分、日本語で約350文字/分になるように調整)
+UTTERANCES_PER_MINUTE = {"english": 10, "japanese": 12}
+
+
+def transcript(utterances, per_minute, hours):
+    count = int(per_minute * 60 * hours)
+    return " ".join(utterances[i % len(utterances)] for i in range(count))
+
+
+def preprocess_separately(text):
+    """ これまでの map_reduce.py と同じ流れ (同じテキストを3回トークン化する) """
+    if count_tokens(text) <= CHUNK_SIZE:
+        return [text]
+    chunks = split_text(text, chunk_size=CHUNK_SIZE)
+    num_tokens = [count_tokens(chunk) for chunk in chunks]
+    return list(zip(chunks, num_tokens))
+
+
+def preprocess_once(text):
+    """ 1回だけトークン化し、ルーティング・分割・流量制限で使い回す """
+    tokens = encode(text)
+    if len(tokens) <= CHUNK_SIZE:
+        return [text]
+    return split_tokens(text, chunk_size=CHUNK_SIZE, tokens=tokens)
+
+
+def measure(preprocess, text, repeat):
+    """ CPU時間 (process_time) の平均を返す """
+    start = time.process_time()
+    for _ in range(repeat):
+        chunks = preprocess(text)
+    return (time.process_time() - start) / repeat, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    count_tokens("warm up")  # エンコーダーの読み込み時間は計測に含めない
+    for language, utterances in [("english", ENGLISH_UTTERANCES), ("japanese", JAPANESE_UTTERANCES)]:
+        for hours in args.hours:
+            text = transcript(utterances, UTTERANCES_PER_MINUTE[language], hours)
+            print(f"== {language} {hours:g}h: {len(text):,} chars / {count_tokens(text):,} tokens")
+            before, chunks = measure(preprocess_separately, text, args.repeat)
+            after, _ = measure(preprocess_once, text, args.repeat)
+            print(f"  separately: {before * 1000:8.1f} ms CPU, {len(chunks)} chunks")
+            print(f"        once: {after * 1000:8.1f} ms CPU ({(after / before - 1) * 100:+.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
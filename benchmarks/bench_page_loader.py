@@ -0,0 +1,108 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/bench_page_loader.py
+"""
+Webサイト要約 (chapter_005/part1/main.py) のページの読み込み方を比較するベンチマーク
+
+保存したHTMLページ (既定は benchmarks/corpus/) を使うのでネットワークには接続しない
+ページごとに、パースと本文の抽出にかかる時間と、LLM に渡すトークン数を計測する
+
+- html.parser: 最初の実装 (pure Python の html.parser で main/article/body のテキストをそのまま使う)
+- bs4+lxml: パーサーだけ lxml にしたもの (ナビゲーションなどはそのまま残る)
+- page_loader: src/page_loader.py と同じ処理 (lxml で不要な要素を取り除いてから本文を取り出す)
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/bench_page_loader.py --repeat 50
+    python benchmarks/bench_page_loader.py --dir ~/saved_pages  # 自分で保存したページで計測
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+import tiktoken
+from bs4 import BeautifulSoup
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "chapter_005", "part1"))
+from src.page_loader import detect_charset, PAGE_EXTRACTOR  # noqa: E402
+from src.extractors import extract  # noqa: E402
+
+
+def main_text(soup):
+    """ 最初の実装と同じく、なるべく本文の可能性が高い要素のテキストを返す """
+    if soup.main:
+        return soup.main.get_text()
+    elif soup.article:
+        return soup.article.get_text()
+    else:
+        return soup.body.get_text()
+
+
+def load_with_html_parser(body):
+    return main_text(BeautifulSoup(body, "html.parser"))
+
+
+def load_with_bs4_lxml(body):
+    return main_text(BeautifulSoup(body, "lxml"))
+
+
+def load_with_page_loader(body):
+    _, content = extract(body.decode(detect_charset({}, body), errors="replace"), PAGE_EXTRACTOR)
+    return content
+
+
+LOADERS = {
+    "html.parser": load_with_html_parser,
+    "bs4+lxml": load_with_bs4_lxml,
+    "page_loader": load_with_page_loader,
+}
+
+
+def measure(load, body, repeat):
+    """ 1回あたりの時間 (ms) の中央値と、抽出したテキストを返す """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        content = load(body)
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[len(times) // 2], content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=os.path.join(BENCHMARK_DIR, "corpus"),
+                        help="保存したHTMLページ (*.html) のディレクトリ")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(os.path.expanduser(args.dir), "*.html")))
+    if not paths:
+        parser.error(f"no *.html files in {args.dir}")
+    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+
+    totals = {name: [0.0, 0] for name in LOADERS}
+    print(f"{'page':>20} {'loader':>12} {'ms':>8} {'tokens':>8} {'vs html.parser':>15}")
+    for path in paths:
+        with open(path, "rb") as f:
+            body = f.read()
+        baseline = None
+        for name, load in LOADERS.items():
+            elapsed_ms, content = measure(load, body, args.repeat)
+            num_tokens = len(encoding.encode(content))
+            baseline = baseline or num_tokens
+            totals[name][0] += elapsed_ms
+            totals[name][1] += num_tokens
+            print(f"{os.path.basename(path)[:20]:>20} {name:>12} {elapsed_ms:>8.2f} {num_tokens:>8,} "
+                  f"{(num_tokens / baseline - 1) * 100:>+14.0f}%")
+
+    print(f"\n== total ({len(paths)} pages)")
+    base_ms, base_tokens = totals["html.parser"]
+    for name, (elapsed_ms, num_tokens) in totals.items():
+        print(f"{name:>12}: {elapsed_ms:8.2f} ms ({base_ms / elapsed_ms:.1f}x), "
+              f"{num_tokens:,} tokens ({(num_tokens / base_tokens - 1) * 100:+.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/bench_text_splitter.py
+"""
+トークン数ベースのテキスト分割を、これまでの実装と共有の分割処理 (src/text_splitter.py) で比較するベンチマーク
+
+- これまで: 呼び出しのたびに RecursiveCharacterTextSplitter.from_tiktoken_encoder を作って分割
+- 共有の分割処理: エンコーダーを使い回し、全体を1回だけトークン化して区切り位置で切る
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/bench_text_splitter.py --repeat 5
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chapter_009"))
+from src.text_splitter import count_tokens, split_text  # noqa: E402
+
+JAPANESE_PARAGRAPH = (
+    "ベアーモバイルLiteは月額990円から使える格安SIMです。データ容量は3GB・10GB・20GBから選ぶことができ、"
+    "余ったデータは翌月に繰り越せます。店舗では契約手続きのほか、端末の設定やデータ移行のお手伝いも行っています。\n"
+)
+ENGLISH_PARAGRAPH = (
+    "Bear Mobile Lite is an affordable SIM plan starting at 990 yen per month. "
+    "You can choose 3GB, 10GB or 20GB of data, and unused data rolls over to the next month. "
+    "Our stores also help you set up your phone and move your data.\n"
+)
+
+
+def long_page(paragraph, paragraphs_per_section=8, sections=200):
+    """ 段落と見出しが続く長いページを作る """
+    return "\n".join(
+        f"## Section {i}\n\n" + paragraph * paragraphs_per_section
+        for i in range(sections)
+    )
+
+
+def split_with_langchain(text, chunk_size):
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        model_name="gpt-3.5-turbo",
+        chunk_size=chunk_size,
+        chunk_overlap=0,
+    )
+    return text_splitter.split_text(text)
+
+
+def split_with_shared(text, chunk_size):
+    return split_text(text, chunk_size=chunk_size, model_name="gpt-3.5-turbo")
+
+
+def measure(split, text, chunk_size, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        chunks = split(text, chunk_size)
+    return (time.perf_counter() - start) / repeat, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    count_tokens("warm up")  # エンコーダーの読み込み時間は計測に含めない
+    for name, text in [("japanese", long_page(JAPANESE_PARAGRAPH)),
+                       ("english", long_page(ENGLISH_PARAGRAPH))]:
+        print(f"== {name}: {len(text):,} chars / {count_tokens(text):,} tokens")
+        for label, split in [("langchain", split_with_langchain), ("shared", split_with_shared)]:
+            elapsed, chunks = measure(split, text, args.chunk_size, args.repeat)
+            max_tokens = max(count_tokens(chunk) for chunk in chunks)
+            print(f"{label:>10}: {elapsed * 1000:8.1f} ms/page, "
+                  f"{len(chunks)} chunks (max {max_tokens} tokens)")
+
+
+if __name__ == '__main__':
+    main()
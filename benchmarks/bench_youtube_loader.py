@@ -0,0 +1,114 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/bench_youtube_loader.py
+"""
+YouTube の動画の情報と字幕の取得 (chapter_005/part2/src/youtube_loader.py) の待ち時間を計測するベンチマーク
+
+YouTube の代わりに、動画の情報と字幕を返すローカルのスタブサーバーを使う
+(それぞれのエンドポイントは `--info-latency` / `--transcript-latency` 秒待ってから応答する)
+
+- sequential: YoutubeLoader(add_video_info=True) と同じく、動画の情報を取得してから字幕を取得する
+- concurrent: YoutubeVideoLoader.load で動画の情報と字幕を同時に取得する
+- bulk: YoutubeVideoLoader.load_many で `--videos` 本をまとめて読み込む (同時に読み込む動画は `--max-workers` 本)
+- cached: 同じ動画をもう一度読み込む (ディスクのキャッシュを使う)
+
+どちらもアプリと同じスケジューラ (youtube.com の同時リクエスト数と間隔の制限) を通して計測する
+(スタブサーバーへのリクエストも youtube.com の動画のURLとして順番待ちする)
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/bench_youtube_loader.py --videos 20
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from stub_server import StubServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chapter_005", "part2"))
+from src.scheduler import scheduler  # noqa: E402
+from src.youtube_loader import (  # noqa: E402
+    YoutubeVideoLoader, YoutubeCache, YOUTUBE_MAX_WORKERS, watch_url)
+
+
+def delayed_json(latency_sec, make_body):
+    """ latency_sec 秒待ってから、クエリの v (動画ID) に応じたJSONを返すハンドラ """
+    def handler(request):
+        time.sleep(latency_sec)
+        video_id = parse_qs(urlparse(request.path).query)["v"][0]
+        body = json.dumps(make_body(video_id), ensure_ascii=False).encode("utf-8")
+        return 200, {"Content-Type": "application/json"}, body
+    return handler
+
+
+def make_fetchers(server):
+    session = requests.Session()
+
+    def fetch_info(video_id):
+        return session.get(server.url(f"/info?v={video_id}"), timeout=10).json()
+
+    def fetch_transcript(video_id, languages):
+        return session.get(server.url(f"/transcript?v={video_id}"), timeout=10).json()["text"]
+    return fetch_info, fetch_transcript
+
+
+def load_sequentially(fetch_info, fetch_transcript):
+    """ これまでの実装と同じく、動画ごとに順番待ちし、動画の情報を取得してから字幕を取得する """
+    def load(video_id):
+        with scheduler.slot(watch_url(video_id)):
+            return fetch_info(video_id), fetch_transcript(video_id, ["en"])
+    return load
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--info-latency", type=float, default=0.3)
+    parser.add_argument("--transcript-latency", type=float, default=0.4)
+    parser.add_argument("--videos", type=int, default=40)
+    parser.add_argument("--max-workers", type=int, default=YOUTUBE_MAX_WORKERS)
+    args = parser.parse_args()
+
+    routes = {
+        "/info": delayed_json(args.info_latency, lambda v: {"title": f"video {v}", "view_count": 0}),
+        "/transcript": delayed_json(args.transcript_latency, lambda v: {"text": f"transcript of {v}"}),
+    }
+    video_ids = [f"video{i:04d}" for i in range(args.videos)]
+
+    with StubServer(routes) as server, tempfile.TemporaryDirectory() as cache_dir:
+        fetch_info, fetch_transcript = make_fetchers(server)
+        sequential = load_sequentially(fetch_info, fetch_transcript)
+        loader = YoutubeVideoLoader(cache=YoutubeCache(cache_dir), max_workers=args.max_workers,
+                                    fetch_info=fetch_info, fetch_transcript=fetch_transcript)
+
+        elapsed, _ = timed(sequential, "single")
+        print(f"  sequential (1 video): {elapsed:6.2f} s")
+        elapsed, _ = timed(loader.load, "single")
+        print(f"  concurrent (1 video): {elapsed:6.2f} s")
+        elapsed, _ = timed(loader.load, "single")
+        print(f"      cached (1 video): {elapsed * 1000:6.2f} ms")
+
+        elapsed, _ = timed(lambda: [sequential(v) for v in video_ids])
+        print(f"  sequential ({args.videos} videos): {elapsed:6.2f} s")
+        requests_before = server.request_count
+        elapsed, results = timed(lambda: list(loader.load_many(video_ids)))
+        errors = sum(error is not None for _, _, error in results)
+        print(f"        bulk ({args.videos} videos): {elapsed:6.2f} s "
+              f"({server.request_count - requests_before} requests, {errors} errors, "
+              f"max_workers={args.max_workers})")
+        elapsed, _ = timed(lambda: list(loader.load_many(video_ids)))
+        print(f"      cached ({args.videos} videos): {elapsed * 1000:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
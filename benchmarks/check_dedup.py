@@ -0,0 +1,96 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/check_dedup.py
+"""
+chapter_005 の remove_near_duplicates が、繰り返しだけを取り除き、
+それ以外の文章を取り除いていないかを確認するスクリプト
+
+- no-repeats: 句読点の無い、ランダムな単語を並べた字幕 (英語・日本語) は1文字も変わらない
+- sponsor read: 2回目のスポンサーの紹介だけが、前後の単語を巻き込まずに取り除かれる
+- near-duplicate: 1単語だけ言い換えた2回目のスポンサーの紹介 (日本語) も取り除かれる
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/check_dedup.py
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chapter_005", "part1"))
+from src.dedup import remove_near_duplicates  # noqa: E402
+
+EN_WORDS = (
+    "data model the a to and of we this that it is in for you on with so just like "
+    "then going really know think right get make look here now okay see what can "
+    "use one two time way people thing actually because all more some"
+).split()
+JA_WORDS = (
+    "今日 は データ の 話 を します それ で この モデル が とても 大事 です ね "
+    "まず 次 に 皆さん と 一緒 見て いき ましょう 例えば ここ 少し 考えて みる 実際 使う 場合"
+).split()
+
+EN_SPONSOR = ("this video is sponsored by bear mobile the affordable sim plan that starts at "
+              "nine hundred ninety yen per month and lets unused data roll over to the next month")
+JA_SPONSOR = "この動画はベアーモバイルの提供でお送りします格安SIMならベアーモバイル月額990円からデータの繰り越しもできます"
+JA_SPONSOR_CHANGED = JA_SPONSOR.replace("格安", "お得な")
+
+
+def random_transcript(words, count, separator, seed):
+    """ 実際の話し言葉のように、よく使う単語ほど多く出てくる (Zipf 分布) ランダムな字幕 """
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return separator.join(rng.choices(words, weights, k=count))
+
+
+def check_no_repeats_en():
+    text = random_transcript(EN_WORDS, 5000, " ", seed=0)
+    deduped, removed = remove_near_duplicates(text)
+    assert deduped == text, f"removed {len(text) - len(deduped)} chars: {removed[:3]}"
+
+
+def check_no_repeats_ja():
+    text = random_transcript(JA_WORDS, 5000, "", seed=0)
+    deduped, removed = remove_near_duplicates(text)
+    assert deduped == text, f"removed {len(text) - len(deduped)} chars: {removed[:3]}"
+
+
+def check_sponsor_read_en():
+    before = random_transcript(EN_WORDS, 300, " ", seed=1)
+    middle = random_transcript(EN_WORDS, 300, " ", seed=2)
+    after = random_transcript(EN_WORDS, 300, " ", seed=3)
+    text = f"{EN_SPONSOR} {before} {EN_SPONSOR} {middle} {after}"
+    deduped, removed = remove_near_duplicates(text)
+    assert removed == [EN_SPONSOR], removed
+    assert deduped == f"{EN_SPONSOR} {before} {middle} {after}", "words around the sponsor read were removed"
+
+
+def check_near_duplicate_ja():
+    before = random_transcript(JA_WORDS, 200, "", seed=1)
+    after = random_transcript(JA_WORDS, 200, "", seed=2)
+    text = f"{JA_SPONSOR}{before}{JA_SPONSOR_CHANGED}{after}"
+    deduped, removed = remove_near_duplicates(text)
+    assert len(removed) == 1 and "お得な" in removed[0], removed
+    assert deduped.startswith(f"{JA_SPONSOR}{before}") and deduped.endswith(after), \
+        "text around the sponsor read was removed"
+    # 直前のひらがなと一緒に区切られた先頭の数文字 (「この」など) は残ることがある
+    leftover = len(deduped) - len(f"{JA_SPONSOR}{before}{after}")
+    assert leftover <= 4, f"{leftover} chars of the sponsor read were left"
+
+
+def main():
+    checks = [check_no_repeats_en, check_no_repeats_ja, check_sponsor_read_en, check_near_duplicate_ja]
+    failed = 0
+    for check in checks:
+        start = time.perf_counter()
+        try:
+            check()
+            result = "ok"
+        except AssertionError as e:
+            failed += 1
+            result = f"FAILED: {e}"
+        print(f"{check.__name__:28s} {time.perf_counter() - start:6.2f}s  {result}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/check_http_client.py
+"""
+chapter_009 の download_html が、おかしなレスポンスを返すサーバーでも
+メモリや時間を使いすぎずに済むかを確認するスクリプト
+
+ローカルのスタブサーバーから次のレスポンスを返し、結果を確認する
+- oversized: 上限より大きなページ (上限で打ち切り、最後まで読んでいない扱いになる)
+- binary: HTML以外 (PDF) の大きなレスポンス (本文を読まずに UnsupportedContentType になり、キャッシュもしない)
+- slow-drip: 少しずつしか送ってこないサーバー (全体の時間の上限で Timeout になる)
+- mis-declared charset: ヘッダーの charset が不正・実際と違うページ (例外にならずにデコードできる)
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/check_http_client.py
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import requests
+
+from stub_server import StubServer, sample_page
+
+# 実行のたびに空のキャッシュから始める (キャッシュのディレクトリは import 時に決まる)
+os.environ["HTTP_CACHE_DIR"] = tempfile.mkdtemp(prefix="check_http_client_")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chapter_009"))
+from src.http_cache import http_cache  # noqa: E402
+from src.http_client import download_html, UnsupportedContentType  # noqa: E402
+
+MAX_BYTES = 64 * 1024
+DRIP_BYTES_PER_SEC = 10
+TOTAL_TIMEOUT_SEC = 1.0
+READ_TIMEOUT_SEC = 3
+
+
+def slow_drip(handler):
+    """ 1秒に DRIP_BYTES_PER_SEC バイトずつ送る (1回の読み込みのタイムアウトにはかからない) """
+    body = sample_page().encode("utf-8")
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/html; charset=utf-8")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    try:
+        for i in range(0, len(body), DRIP_BYTES_PER_SEC):
+            handler.wfile.write(body[i:i + DRIP_BYTES_PER_SEC])
+            handler.wfile.flush()
+            time.sleep(1)
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+def check_oversized(server):
+    status, html, complete = download_html(server.url("/oversized"), max_bytes=MAX_BYTES)
+    assert status == 200, status
+    assert len(html) <= MAX_BYTES, len(html)  # 1文字は1バイト以上なので、文字数も上限以下になる
+    assert not complete
+
+
+def check_binary(server):
+    url = server.url("/binary.pdf")
+    try:
+        download_html(url, max_bytes=MAX_BYTES)
+    except UnsupportedContentType as e:
+        assert e.content_type == "application/pdf", e.content_type
+    else:
+        raise AssertionError("UnsupportedContentType was not raised")
+    assert http_cache.get(url) is None, "binary response was cached"
+
+
+def check_slow_drip(server):
+    start = time.monotonic()
+    try:
+        download_html(server.url("/slow"), timeout_sec=READ_TIMEOUT_SEC, total_timeout_sec=TOTAL_TIMEOUT_SEC)
+    except requests.exceptions.Timeout:
+        pass
+    else:
+        raise AssertionError("Timeout was not raised")
+    elapsed = time.monotonic() - start
+    # 1回の読み込みは1秒以内に終わるので、全体の上限 + 読み込み1回分までに打ち切られるはず
+    assert elapsed < TOTAL_TIMEOUT_SEC + 1.5, f"took {elapsed:.1f}s"
+    assert http_cache.get(server.url("/slow")) is None, "partial response was cached"
+
+
+def check_misdeclared_charset(server):
+    # ヘッダーの charset が存在しないもの → <meta> の Shift_JIS でデコードする
+    status, html, _ = download_html(server.url("/bogus-charset"))
+    assert status == 200, status
+    assert "料金プラン" in html, html[:200]
+    # ヘッダーは utf-8 だが中身は Shift_JIS → 例外にならず、不正なバイトは置き換える
+    status, html, _ = download_html(server.url("/wrong-charset"))
+    assert status == 200, status
+    assert "�" in html
+
+
+def main():
+    sjis_page = sample_page(5).replace('charset="utf-8"', 'charset="shift_jis"').encode("shift_jis")
+    routes = {
+        "/oversized": (200, {"Content-Type": "text/html; charset=utf-8"},
+                       sample_page(5000).encode("utf-8")),
+        "/binary.pdf": (200, {"Content-Type": "application/pdf"}, b"%PDF-1.7\n" + b"\0" * (4 * 1024 * 1024)),
+        "/slow": slow_drip,
+        "/bogus-charset": (200, {"Content-Type": "text/html; charset=x-no-such-charset"}, sjis_page),
+        "/wrong-charset": (200, {"Content-Type": "text/html; charset=utf-8"}, sjis_page),
+    }
+    checks = [check_oversized, check_binary, check_slow_drip, check_misdeclared_charset]
+    failed = 0
+    with StubServer(routes) as server:
+        for check in checks:
+            start = time.perf_counter()
+            try:
+                check(server)
+                result = "ok"
+            except AssertionError as e:
+                failed += 1
+                result = f"FAILED: {e}"
+            print(f"{check.__name__:28s} {time.perf_counter() - start:6.2f}s  {result}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/fake_llm.py
+
+import time
+import asyncio
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+def tool_call(name, args, call_id=None):
+    """ ツール呼び出しを行う AIMessage を作る """
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": name, "args": args, "id": call_id or f"call_{name}"}]
+    )
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    あらかじめ用意した AIMessage の列 (trajectory) を順番に返すだけの偽物のチャットモデル
+
+    - ユーザーの最後の入力以降に何回 AI が発言したか (= エージェントのステップ数) を数え、
+      trajectory の対応する位置のメッセージを返す
+    - 状態を持たないので、複数のセッションから同時に呼び出しても結果は決定的
+    - `latency_sec` で LLM API の応答時間を模擬できる
+
+    有料のモデルを呼ばずに、ツール実行・検索・メモリ・プロンプト組み立てといった
+    自前のコードのオーバーヘッドだけを計測するために利用する
+
+    Example:
+    ===============
+    llm = ReplayChatModel(
+        trajectory=[
+            tool_call("fetch_stores_by_prefecture", {"pref": "東京"}),
+            AIMessage(content="東京の店舗は東京スカイツリータウン店です。"),
+        ],
+        latency_sec=0.5
+    )
+    """
+    trajectory: List[BaseMessage]
+    latency_sec: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        # 返すメッセージは決まっているのでツールの情報は使わない
+        return self
+
+    def _next_message(self, messages):
+        step = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                step += 1
+        step = min(step, len(self.trajectory) - 1)
+        return self.trajectory[step].copy()
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency_sec)
+        return ChatResult(generations=[
+            ChatGeneration(message=self._next_message(messages))
+        ])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency_sec)
+        return ChatResult(generations=[
+            ChatGeneration(message=self._next_message(messages))
+        ])
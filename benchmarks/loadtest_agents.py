@@ -0,0 +1,162 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/loadtest_agents.py
+"""
+偽物のLLM (ReplayChatModel) を使ってエージェントに負荷をかけるスクリプト
+
+有料のモデルを呼ばずに、決められたツール呼び出しの流れを再生することで
+ツール実行・検索・メモリ・プロンプト組み立てなど「自前のコード」の
+スループットとレイテンシを計測する
+
+使い方 (リポジトリのルートで実行してください):
+    python benchmarks/loadtest_agents.py --chapter chapter_010 --sessions 20 --turns 5
+    python benchmarks/loadtest_agents.py --chapter chapter_009 --sessions 10 --llm-latency 0.2
+
+各章のシナリオ:
+- chapter_009: ローカルのスタブサーバーのページを fetch_page で読んで回答する
+  (search_ddg は DuckDuckGo への通信が発生するため使わない)
+- chapter_010: fetch_stores_by_prefecture で店舗を検索して回答する
+  (fetch_qa_content は埋め込みの計算で OpenAI API を呼ぶため使わない)
+- chapter_011: Code Interpreter は OpenAI API を呼ぶため、ツールを使わずに回答する
+  (エージェントのループ・メモリ・プロンプト組み立てのみ計測する)
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import statistics
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents import create_tool_calling_agent, AgentExecutor
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
+
+from fake_llm import ReplayChatModel, tool_call
+from stub_server import StubServer, sample_page
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_chapter(chapter):
+    """
+    各章のコードは章のディレクトリで実行される前提 (`from tools...` や相対パス) なので、
+    カレントディレクトリと import パスを章のディレクトリに切り替える
+    """
+    chapter_dir = os.path.join(ROOT_DIR, chapter)
+    os.chdir(chapter_dir)
+    sys.path.insert(0, chapter_dir)
+
+
+def build_scenario(chapter, server):
+    """ 章ごとの (システムプロンプト, ツール, 再生するメッセージの列) を返す """
+    if chapter == "chapter_009":
+        main = importlib.import_module("main")
+        from tools.fetch_page import fetch_page
+        return main.CUSTOM_SYSTEM_PROMPT, [fetch_page], [
+            tool_call("fetch_page", {"url": server.url("/page"), "page_num": 0}),
+            AIMessage(content="ベアーモバイルLiteは月額990円からです。\n参照: " + server.url("/page")),
+        ]
+    elif chapter == "chapter_010":
+        main = importlib.import_module("main")
+        from tools.fetch_stores_by_prefecture import fetch_stores_by_prefecture
+        return main.CUSTOM_SYSTEM_PROMPT, [fetch_stores_by_prefecture], [
+            tool_call("fetch_stores_by_prefecture", {"pref": "東京"}),
+            AIMessage(content="東京の店舗は「ベアーモバイル 東京スカイツリータウン店」です。"),
+        ]
+    elif chapter in ("chapter_011/part1", "chapter_011/part2"):
+        with open("./prompt/system_prompt.txt", "r", encoding="utf-8") as f:
+            system_prompt = f.read()
+        from tools.code_interpreter import code_interpreter_tool
+        return system_prompt, [code_interpreter_tool], [
+            AIMessage(content="分析の計画を立てました。まずファイルの内容を確認します。"),
+        ]
+    raise ValueError(f"unknown chapter: {chapter}")
+
+
+def create_agent(system_prompt, tools, trajectory, llm_latency):
+    """ 各章の create_agent() と同じ構成のエージェントを偽物のLLMで作る """
+    from src.memory import TokenBudgetMemory
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad")
+    ])
+    llm = ReplayChatModel(trajectory=trajectory, latency_sec=llm_latency)
+    memory = TokenBudgetMemory(
+        llm=ReplayChatModel(trajectory=[AIMessage(content="(これまでの会話の要約)")],
+                            latency_sec=llm_latency),
+        return_messages=True,
+        memory_key="chat_history",
+        max_token_limit=2000
+    )
+    agent = create_tool_calling_agent(llm, tools, prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=False, memory=memory)
+
+
+def run_session(agent, turns):
+    latencies = []
+    for i in range(turns):
+        start = time.perf_counter()
+        agent.invoke({"input": f"質問 {i}: 東京の店舗と料金プランについて教えて"})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapter", default="chapter_010",
+                        choices=["chapter_009", "chapter_010", "chapter_011/part1", "chapter_011/part2"])
+    parser.add_argument("--sessions", type=int, default=10, help="同時に実行するセッション数")
+    parser.add_argument("--turns", type=int, default=5, help="1セッションあたりの会話の往復数")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="偽物のLLMの1回あたりの応答時間 (秒)")
+    args = parser.parse_args()
+
+    server = StubServer({
+        "/page": (200, {"Content-Type": "text/html; charset=utf-8"},
+                  sample_page().encode("utf-8")),
+    }).start()
+    load_chapter(args.chapter)
+    system_prompt, tools, trajectory = build_scenario(args.chapter, server)
+    agents = [create_agent(system_prompt, tools, trajectory, args.llm_latency)
+              for _ in range(args.sessions)]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        results = list(executor.map(lambda a: run_session(a, args.turns), agents))
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    server.stop()
+
+    latencies = [latency for result in results for latency in result]
+    # 偽物のLLMの待ち時間を差し引いたものが自前のコードのオーバーヘッド
+    llm_wait = args.llm_latency * len(trajectory)
+    overheads = [max(0.0, latency - llm_wait) for latency in latencies]
+
+    print(f"chapter:        {args.chapter}")
+    print(f"sessions/turns: {args.sessions} x {args.turns} (= {len(latencies)} turns)")
+    print(f"throughput:     {len(latencies) / elapsed:.1f} turns/sec")
+    print(f"latency (ms):   p50={percentile(latencies, 50) * 1000:.1f} "
+          f"p90={percentile(latencies, 90) * 1000:.1f} "
+          f"p99={percentile(latencies, 99) * 1000:.1f} "
+          f"mean={statistics.mean(latencies) * 1000:.1f}")
+    print(f"overhead (ms):  p50={percentile(overheads, 50) * 1000:.1f} "
+          f"p99={percentile(overheads, 99) * 1000:.1f} "
+          f"(LLM wait {llm_wait * 1000:.0f}ms/turn excluded)")
+    # Linux の ru_maxrss は KB 単位
+    print(f"max RSS:        {rss_after / 1024:.1f} MB (+{(rss_after - rss_before) / 1024:.1f} MB during run)")
+
+
+if __name__ == '__main__':
+    main()
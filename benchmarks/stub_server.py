@@ -0,0 +1,134 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/benchmarks/stub_server.py
+
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+SAMPLE_HTML = """<!DOCTYPE html>
+<html lang="ja">
+<head><meta charset="utf-8"><title>ベアーモバイル 料金プランのご案内</title></head>
+<body>
+<nav><a href="/">ホーム</a> | <a href="/plans">料金プラン</a> | <a href="/stores">店舗一覧</a></nav>
+<main><article>
+<h1>ベアーモバイル 料金プランのご案内</h1>
+{paragraphs}
+</article></main>
+<footer>Copyright Bear Mobile</footer>
+</body>
+</html>
+"""
+
+PARAGRAPH = (
+    "<p>ベアーモバイルLiteは月額990円から使える格安SIMです。"
+    "データ容量は3GB・10GB・20GBから選ぶことができ、余ったデータは翌月に繰り越せます。"
+    "Bear Mobile Lite is an affordable SIM plan starting at 990 yen per month, "
+    "and unused data rolls over to the next month.</p>\n"
+)
+
+
+def sample_page(num_paragraphs=50):
+    """ ベンチマーク用のそれらしいHTMLページを作る """
+    return SAMPLE_HTML.format(paragraphs=PARAGRAPH * num_paragraphs)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # クライアントが途中で切断した場合 (サイズ上限での打ち切りなど) はエラーを表示しない
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StubServer:
+    """
+    外部のWebサイトやAPIの代わりになるローカルHTTPサーバー
+
+    ベンチマークや負荷試験で、ネットワークの状況に左右されずに
+    自前のコードの性能を測るために利用する
+
+    `routes` には パス -> (ステータスコード, ヘッダーのdict, bodyのbytes) を指定する
+    値に関数を指定すると、リクエストハンドラを引数にして呼び出され、戻り値がレスポンスになる
+    パスの末尾を `*` にすると、それより前が一致する全てのパスに使われる (例: "/feedback/*")
+    `connect_delay_sec` を指定すると新しい接続ごとに待ち時間が入る (TLS ハンドシェイクなどの模擬)
+    POST されたリクエストの body は `received` に (パス, body) として、DELETE されたパスは `deleted` に記録される
+    (DELETE のレスポンスも routes から返す。routes に無いパスは 404)
+    (例: LangSmith の代わりに `Client(api_url=server.url(), api_key="dummy")` として使える)
+
+    Example:
+    ===============
+    with StubServer({"/page": (200, {"Content-Type": "text/html"}, b"<html>...</html>")}) as server:
+        requests.get(server.url("/page"))
+    """
+    def __init__(self, routes, host="127.0.0.1", port=0, connect_delay_sec=0.0):
+        self.routes = routes
+        self.connect_delay_sec = connect_delay_sec
+        self.connection_count = 0
+        self.request_count = 0
+        self.received = []
+        self.deleted = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive を有効にする
+
+            def setup(self):
+                stub.connection_count += 1
+                time.sleep(stub.connect_delay_sec)
+                super().setup()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                stub.received.append((self.path, self.rfile.read(length)))
+                self.do_GET()
+
+            def do_DELETE(self):
+                stub.deleted.append(self.path)
+                self.do_GET()
+
+            def do_GET(self):
+                stub.request_count += 1
+                path = self.path.split("?")[0]
+                route = stub.routes.get(path)
+                if route is None:
+                    route = next((r for p, r in stub.routes.items()
+                                  if p.endswith("*") and path.startswith(p[:-1])), None)
+                if route is None:
+                    route = (404, {"Content-Type": "text/plain"}, b"not found")
+                elif callable(route):
+                    route = route(self)
+                    if route is None:  # ハンドラ側でレスポンスを書き込んだ場合
+                        return
+                status, headers, body = route
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 大量のアクセスログを出さない
+
+        self.httpd = _QuietHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path="/"):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
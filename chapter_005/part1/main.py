@@ -10,9 +10,11 @@ from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
+from src.page_loader import load_page
+from src.text_splitter import count_tokens
+from src.dedup import remove_near_duplicates
+from src.summary_cache import summary_cache, summary_key, get_model_id, canonical_url
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -70,8 +72,7 @@ def select_model(temperature=0):
         )
 
 
-def init_chain():
-    llm = select_model()
+def init_chain(llm):
     prompt = ChatPromptTemplate.from_messages([
         ("user", SUMMARIZE_PROMPT),
     ])
@@ -92,23 +93,32 @@ def validate_url(url):
 def get_content(url):
     try:
         with st.spinner("Fetching Website ..."):
-            response = requests.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # なるべく本文の可能性が高い要素を取得する
-            if soup.main:
-                return soup.main.get_text()
-            elif soup.article:
-                return soup.article.get_text()
-            else:
-                return soup.body.get_text()
+            # タイムアウトとサイズの上限を設けて取得し、ナビゲーション・広告などを取り除いた本文を使う
+            # (取得したページはディスクにキャッシュし、サイトごとに順番待ちしてからリクエストする)
+            status_code, _, content = load_page(url)
+            if status_code != 200:
+                st.write(f"Could not fetch the page (status: {status_code})")
+                return None
+            return content
     except:
         st.write(traceback.format_exc())  # エラーが発生した場合はエラー内容を表示
         return None
 
 
+def remove_duplicates(content):
+    """ ほぼ同じ内容の段落 (繰り返されるナビゲーションや注意書きなど) を取り除き、減らせたトークン数を表示する """
+    content, removed = remove_near_duplicates(content)
+    num_tokens = count_tokens("\n".join(removed)) if removed else 0
+    st.caption(f"Near-duplicate segments: {len(removed)} removed ({num_tokens:,} tokens)")
+    return content
+
+
 def main():
     init_page()
-    chain = init_chain()
+    llm = select_model()
+    chain = init_chain(llm)
+    # 重複した段落は要約しても意味がなく料金だけがかかるので、LLM に渡す前に取り除く
+    dedup = st.sidebar.checkbox("Remove near-duplicate segments", value=True)
 
     # ユーザーの入力を監視
     if url := st.text_input("URL: ", key="input"):
@@ -117,8 +127,16 @@ def main():
             st.write('Please input valid url')
         else:
             if content := get_content(url):
+                if dedup:
+                    content = remove_duplicates(content)
                 st.markdown("## Summary")
-                st.write_stream(chain.stream({"content": content}))
+                # 同じページ・内容・モデル・プロンプトの要約は、再度 LLM を呼ばずにキャッシュを使う
+                key = summary_key(canonical_url(url), content, get_model_id(llm), SUMMARIZE_PROMPT)
+                if (summary := summary_cache.get(key)) is not None:
+                    st.write(summary)
+                else:
+                    summary = st.write_stream(chain.stream({"content": content}))
+                    summary_cache.set(key, summary)
                 st.markdown("---")
                 st.markdown("## Original Text")
                 st.write(content)
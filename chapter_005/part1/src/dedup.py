@@ -0,0 +1,151 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part1/src/dedup.py
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+# 似ているとみなす Jaccard 係数 (MinHash の推定値) の下限
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))
+# これより長い文 (句読点の無い自動生成の字幕など) は、文単位ではなく繰り返されている部分を探して取り除く
+SEGMENT_CHARS = 300
+# これより短い区間は削除しない (見出しや短い相づちなど、重複していても意味があることが多い)
+MIN_SEGMENT_CHARS = 30
+# 句読点の無い長い文で、繰り返しを探すときに比較する窓のトークン数と、取り除く繰り返しの最小のトークン数
+# (文字数の短い窓だと、よく使う言い回しが偶然一致して取り除かれてしまう)
+REPEAT_WINDOW_TOKENS = 7
+MIN_REPEAT_TOKENS = 16
+# 繰り返しの途中にこれ以下のトークン数の違い (1単語だけ言い換えたなど) があっても、ひと続きの繰り返しとみなす
+# (日本語は前後のひらがなと一緒に区切られるので、1単語の違いでも2〜3トークンが変わる)
+MAX_GAP_TOKENS = 4
+# 何文字ずつの部分文字列 (shingle) で比較するか (日本語にも使えるように単語ではなく文字で区切る)
+SHINGLE_CHARS = 5
+# MinHash のハッシュ関数の数と、LSH のバンド数 (1バンドあたり NUM_PERM / LSH_BANDS 個)
+# 16 バンド x 4 個だと Jaccard 係数が 0.5 程度以上の組を候補として見つけられる
+NUM_PERM = 64
+LSH_BANDS = 16
+
+# 文の区切り (区切りの文字は前の文に含める)
+SENTENCE_PATTERN = re.compile(r"[^\n]*?(?:[。．！？!?]+|\.(?=\s)|\n+|$)\s*")
+
+# 繰り返しを探すときのトークン: 英数字などの単語、ひらがな・カタカナ・漢字それぞれの連続、記号1文字
+# (日本語は単語の間に空白が無いので、文字の種類が変わるところで区切って単語の代わりにする)
+TOKEN_PATTERN = re.compile(
+    r"[\u3040-\u309F]+|[\u30A0-\u30FF]+|[\u3400-\u9FFF々]+|[^\W_\u3040-\u30FF\u3400-\u9FFF々]+|\S")
+
+# 2^31 - 1 (素数) を法とするハッシュ関数 (a * x + b) mod p を NUM_PERM 個用意する
+# (a, x < 2^31 なので a * x + b は uint64 に収まる)
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(42)
+_A = _rng.randint(1, (1 << 31) - 1, size=(NUM_PERM, 1)).astype(np.uint64)
+_B = _rng.randint(0, (1 << 31) - 1, size=(NUM_PERM, 1)).astype(np.uint64)
+
+
+def split_segments(text):
+    """
+    重複を判定する単位 (文・行) に分ける
+    各区間は後ろの区切り (改行・空白) を含むので、つなげると元のテキストに戻る
+    """
+    return [s for s in SENTENCE_PATTERN.findall(text) if s]
+
+
+def remove_repeats(segment, seen, offset):
+    """
+    句読点の無い長い文から、それより前に出てきた部分と同じ内容の区間 (MIN_REPEAT_TOKENS トークン以上) を取り除く
+
+    文に区切れないので、REPEAT_WINDOW_TOKENS トークンの窓を1トークンずつずらしながら (どこから始まっていても)
+    それまでに出てきたかを調べる (seen: 窓の内容 -> 最初に出てきた窓の終わりのテキスト全体での位置)
+
+    Returns
+    -------
+    Tuple[str, List[str]]: (繰り返しを取り除いた文, 取り除いた区間のリスト)
+    """
+    tokens = list(TOKEN_PATTERN.finditer(segment))
+    words = [token.group().lower() for token in tokens]
+    k = REPEAT_WINDOW_TOKENS
+    duplicated = [False] * len(tokens)
+    for i in range(len(tokens) - k + 1):
+        first_end = seen.setdefault(tuple(words[i:i + k]), offset + tokens[i + k - 1].end())
+        # 自分自身と重なる位置 (同じ言葉の連続など) での一致は繰り返しとみなさない
+        if first_end <= offset + tokens[i].start():
+            duplicated[i:i + k] = [True] * k
+
+    # 繰り返しのトークンをひと続きの区間にまとめる (間の違いが MAX_GAP_TOKENS 以下ならつなげる)
+    runs = []
+    for i, is_duplicated in enumerate(duplicated):
+        if not is_duplicated:
+            continue
+        if runs and i - runs[-1][1] <= MAX_GAP_TOKENS:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+
+    kept, removed = [], []
+    start = 0
+    for begin, end in runs:
+        if end - begin < MIN_REPEAT_TOKENS:
+            continue
+        # 区間の後ろの空白も取り除き、前後の文の間の空白が1つになるようにする
+        end = tokens[end].start() if end < len(tokens) else tokens[-1].end()
+        begin = tokens[begin].start()
+        kept.append(segment[start:begin])
+        removed.append(segment[begin:end].strip())
+        start = end
+    kept.append(segment[start:])
+    return "".join(kept), removed
+
+
+def minhash(segment):
+    """ 文字の shingle の集合の MinHash シグネチャ (NUM_PERM 個の整数) """
+    # 大文字・小文字、記号、空白の違いは無視する
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", segment.lower()).split())
+    shingles = {normalized[i:i + SHINGLE_CHARS]
+                for i in range(max(len(normalized) - SHINGLE_CHARS + 1, 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & 0x7FFFFFFF for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    return ((_A * hashes + _B) % _PRIME).min(axis=1)
+
+
+def remove_near_duplicates(text, threshold=DEDUP_THRESHOLD):
+    """
+    ほぼ同じ内容の区間 (字幕の冒頭の挨拶やスポンサーの紹介、繰り返されるナビゲーションなど) を、
+    最初に出てきたものだけを残して取り除く
+
+    - 文・行ごとに MinHash を計算し、LSH のバンドごとのバケットに入れて、同じバケットに入った文とだけ比較する
+      (文の数が多くてもほぼ線形の時間で済み、言い回しや記号が少し違うものも見つけられる)
+    - 句読点の無い長い文 (自動生成の字幕など) は、文の区切りで比較できないので、
+      繰り返されている部分を位置に関係なく探して取り除く (remove_repeats)
+
+    Returns
+    -------
+    Tuple[str, List[str]]: (重複を取り除いたテキスト, 取り除いた区間のリスト)
+    """
+    rows = NUM_PERM // LSH_BANDS
+    buckets = {}
+    signatures = []
+    seen_windows = {}
+    kept, removed = [], []
+    offset = 0
+    for segment in split_segments(text):
+        segment_offset, offset = offset, offset + len(segment)
+        if len(segment.strip()) < MIN_SEGMENT_CHARS:
+            kept.append(segment)
+            continue
+        if len(segment) > SEGMENT_CHARS:
+            segment, repeats = remove_repeats(segment, seen_windows, segment_offset)
+            kept.append(segment)
+            removed += repeats
+            continue
+        signature = minhash(segment)
+        bands = [(band, signature[band * rows:(band + 1) * rows].tobytes())
+                 for band in range(LSH_BANDS)]
+        candidates = {i for band in bands for i in buckets.get(band, ())}
+        if any(np.mean(signatures[i] == signature) >= threshold for i in candidates):
+            removed.append(segment.strip())
+            continue
+        for band in bands:
+            buckets.setdefault(band, []).append(len(signatures))
+        signatures.append(signature)
+        kept.append(segment)
+    return "".join(kept), removed
@@ -0,0 +1,241 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/batch.py
+"""
+WebページやYouTube動画をまとめて要約するコマンドラインツール (Streamlit を使わずに実行できる)
+
+- URLのリスト (1行に1つ, # から始まる行は無視) や YouTube の再生リストから要約する
+- 字幕やページの取得は並列に行う (サイトごとの同時接続数・間隔はスケジューラで制限する)
+- LLM の呼び出しは、全ての文書で共有する同時実行数と1分あたりのトークン数の上限の中で行う
+- 結果は1件ごとに JSONL で出力し、再実行時は出力済みのURLをスキップする (途中から再開できる)
+- 要約は map_reduce.py と同じキャッシュを使うので、一度要約したチャンクは再度 LLM を呼ばない
+- ほぼ同じ内容の区間は要約する前に取り除き、減らせたトークン数を removed_tokens に出力する
+
+使い方 (chapter_005/part2 で実行してください):
+    python batch.py --input urls.txt --output summaries.jsonl
+    python batch.py --playlist "https://www.youtube.com/playlist?list=..." --output summaries.jsonl
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from langchain_core.runnables import RunnableLambda
+from langchain_community.document_loaders import YoutubeLoader
+
+# models
+from langchain_openai import ChatOpenAI
+from langchain_anthropic import ChatAnthropic
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from src.summarize import SUMMARIZE_PROMPT, MAP_PROMPT, init_summarize_chain
+from src.page_loader import load_page as fetch_page
+from src.text_splitter import count_tokens, encode, split_tokens
+from src.parallel_map import (
+    get_rate_limiter, run_map, invoke_with_retry, MAP_TOKENS_PER_MINUTE, OUTPUT_TOKENS_ESTIMATE)
+from src.tree_reduce import collapse
+from src.dedup import remove_near_duplicates
+from src.youtube_loader import youtube_loader
+from src.chunk_planner import get_model_profile, plan_summary
+from src.summary_cache import (
+    summary_cache, summary_key, get_model_id, get_model_name, with_chunk_cache, canonical_url)
+
+YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "youtu.be")
+
+
+def select_model(model_name, temperature=0):
+    if model_name.startswith("claude"):
+        return ChatAnthropic(temperature=temperature, model_name=model_name)
+    elif model_name.startswith("gemini"):
+        return ChatGoogleGenerativeAI(temperature=temperature, model=model_name)
+    else:
+        return ChatOpenAI(temperature=temperature, model_name=model_name)
+
+
+def read_urls(input_path=None, playlists=()):
+    """ ファイルと再生リストからURLを読み込む (重複は除く) """
+    urls = []
+    if input_path:
+        with open(input_path, encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    for playlist_url in playlists:
+        from pytube import Playlist  # 再生リストを使う場合だけ必要
+        urls += list(Playlist(playlist_url).video_urls)
+    return list(dict.fromkeys(urls))
+
+
+def read_done_urls(output_path):
+    """ 出力済みのJSONLから、要約に成功したURLを読み込む (途中から再開するため) """
+    done = set()
+    try:
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 途中で中断されて壊れた行は無視する
+                if record.get("status") == "ok":
+                    done.add(record["url"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def is_youtube(url):
+    return (urlparse(url).hostname or "").lower() in YOUTUBE_HOSTS
+
+
+def load_youtube(url):
+    """ YouTube の字幕を取得して (ソースの識別子, タイトル, 本文) を返す """
+    # 動画の情報と字幕は同時に取得し、全ての動画で共有するスレッドプールで同時リクエスト数を制限する
+    video_id = YoutubeLoader.extract_video_id(url)
+    document = youtube_loader.load(video_id)
+    if document is None:
+        raise ValueError("transcript not found")
+    title = document.metadata['title']
+    return f"youtube:{video_id}", title, f"Title: {title}\n\n{document.page_content}"
+
+
+def load_page(url):
+    """
+    Webページを取得して (ソースの識別子, タイトル, 本文) を返す
+    (part1/main.py と同じく、タイムアウト・サイズの上限を設けて取得し、ナビゲーションなどを取り除く)
+    """
+    status_code, title, content = fetch_page(url)
+    if status_code != 200:
+        raise ValueError(f"status code {status_code}")
+    return canonical_url(url), title or "", content
+
+
+class BatchSummarizer:
+    """
+    複数の文書を要約する
+
+    LLM の呼び出しは全て _budgeted() を通し、全ての文書で共有する
+    - 同時呼び出し数の上限 (max_concurrency)
+    - 1分あたりのトークン数の上限 (tokens_per_minute)
+    の中で行う (キャッシュにあるチャンクは LLM を呼ばないので、上限を消費しない)
+    """
+    def __init__(self, llm, max_concurrency, tokens_per_minute):
+        self.model_id = get_model_id(llm)
+        self.profile = get_model_profile(llm)
+        self.limiter = get_rate_limiter(get_model_name(llm), tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.summarize_chain = self._budgeted(init_summarize_chain(llm))
+        self.map_chain = with_chunk_cache(
+            self._budgeted(init_summarize_chain(llm, MAP_PROMPT)),
+            summary_cache, self.model_id, MAP_PROMPT)
+
+    def _budgeted(self, chain):
+        """ 全体の1分あたりのトークン数・同時実行数の上限の中で chain を呼び出す """
+        def invoke(x, config):
+            if self.limiter:
+                num_tokens = x.get("num_tokens") or count_tokens(
+                    x["content"], self.profile["encoding_model"])
+                self.limiter.acquire(num_tokens + OUTPUT_TOKENS_ESTIMATE)
+            with self._semaphore:
+                return chain.invoke(x, config)
+        return RunnableLambda(invoke)
+
+    def summarize(self, source_id, content):
+        """ map_reduce.py と同じ流れで要約する (結果はキャッシュに保存する) """
+        key = summary_key(source_id, content, self.model_id, MAP_PROMPT, SUMMARIZE_PROMPT)
+        if (summary := summary_cache.get(key)) is not None:
+            return summary, True
+
+        encoding_model = self.profile["encoding_model"]
+        tokens = encode(content, model_name=encoding_model)
+        plan = plan_summary(len(tokens), self.profile, self.max_concurrency)
+        if plan["mode"] == "single":
+            summary = invoke_with_retry(
+                self.summarize_chain, {"content": content, "num_tokens": len(tokens)})
+        else:
+            chunks = [
+                {"content": chunk, "num_tokens": num_tokens} for chunk, num_tokens
+                in split_tokens(content, chunk_size=plan["chunk_size"],
+                                model_name=encoding_model, tokens=tokens)
+            ]
+            # LLM の同時呼び出し数・トークン数は全体で制限する (_budgeted) ので、ここでは制限しない
+            # (スレッドは全体の同時呼び出し数の上限より多く作っても待つだけなので、それ以下にする)
+            summaries = run_map(self.map_chain, chunks,
+                                max_concurrency=min(len(chunks), self.max_concurrency),
+                                tokens_per_minute=0)
+            summaries, _ = collapse(self.summarize_chain, summaries, token_budget=plan["budget"],
+                                    max_concurrency=self.max_concurrency, tokens_per_minute=0,
+                                    model_name=encoding_model)
+            summary = invoke_with_retry(self.summarize_chain, {"content": '\n'.join(summaries)})
+        summary_cache.set(key, summary)
+        return summary, False
+
+
+def process(url, summarizer):
+    """ 1件のURLを取得・要約して、JSONL に書き出すレコードを返す """
+    started_at = time.monotonic()
+    record = {"url": url}
+    try:
+        source_id, title, content = load_youtube(url) if is_youtube(url) else load_page(url)
+        content, removed = remove_near_duplicates(content)
+        summary, cached = summarizer.summarize(source_id, content)
+        record.update({
+            "status": "ok", "source_id": source_id, "title": title,
+            "summary": summary, "cached": cached, "removed_segments": len(removed),
+            "removed_tokens": count_tokens(
+                "\n".join(removed), summarizer.profile["encoding_model"]) if removed else 0,
+        })
+    except Exception as e:
+        record.update({"status": "error", "error": repr(e), "traceback": traceback.format_exc()})
+    record.update({
+        "model": summarizer.model_id,
+        "elapsed_sec": round(time.monotonic() - started_at, 3),
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    })
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="URLのリストのファイル (1行に1つ)")
+    parser.add_argument("--playlist", action="append", default=[], help="YouTube の再生リストのURL")
+    parser.add_argument("--output", required=True, help="結果を書き出す JSONL ファイル (追記する)")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--fetch-concurrency", type=int, default=8,
+                        help="同時に取得・要約する文書の数")
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="全体での LLM の同時呼び出し数の上限")
+    parser.add_argument("--tokens-per-minute", type=int, default=MAP_TOKENS_PER_MINUTE,
+                        help="全体で1分あたりに LLM に送るトークン数の上限 (0 で無制限)")
+    args = parser.parse_args()
+    if not args.input and not args.playlist:
+        parser.error("--input か --playlist を指定してください")
+
+    urls = read_urls(args.input, args.playlist)
+    done = read_done_urls(args.output)
+    todo = [url for url in urls if url not in done]
+    print(f"{len(urls)} urls ({len(done & set(urls))} already done, {len(todo)} to go)",
+          file=sys.stderr)
+
+    summarizer = BatchSummarizer(select_model(args.model), args.max_concurrency,
+                                 args.tokens_per_minute)
+    failed = 0
+    with open(args.output, "a", encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=args.fetch_concurrency) as executor:
+        futures = [executor.submit(process, url, summarizer) for url in todo]
+        for i, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            # 1件ずつ書き出して flush するので、途中で止まってもそこまでの結果は残る
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            failed += record["status"] != "ok"
+            print(f"[{i}/{len(todo)}] {record['status']} {record['url']} "
+                  f"({record['elapsed_sec']:.1f}s)", file=sys.stderr)
+    print(f"done: {len(todo) - failed} ok, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
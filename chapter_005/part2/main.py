@@ -12,6 +12,8 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 from urllib.parse import urlparse
 from langchain_community.document_loaders import YoutubeLoader  # Youtube用
+from src.scheduler import scheduler
+from src.summary_cache import summary_cache, summary_key, get_model_id
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -69,8 +71,7 @@ def select_model(temperature=0):
         )
 
 
-def init_chain():
-    llm = select_model()
+def init_chain(llm):
     prompt = ChatPromptTemplate.from_messages([
         ("user", SUMMARIZE_PROMPT),
     ])
@@ -108,7 +109,9 @@ def get_content(url):
             add_video_info=True,  # タイトルや再生数も取得できる
             language=['en', 'ja']  # 英語→日本語の優先順位で字幕を取得
         )
-        res = loader.load()  # list of `Document` (page_content, metadata)
+        # 同時に多くのユーザーが使っても YouTube に制限されないように、スケジューラで順番待ちする
+        with scheduler.slot(url):
+            res = loader.load()  # list of `Document` (page_content, metadata)
         try:
             if res:
                 content = res[0].page_content
@@ -123,7 +126,8 @@ def get_content(url):
 
 def main():
     init_page()
-    chain = init_chain()
+    llm = select_model()
+    chain = init_chain(llm)
 
     # ユーザーの入力を監視
     if url := st.text_input("URL: ", key="input"):
@@ -133,7 +137,13 @@ def main():
         else:
             if content := get_content(url):
                 st.markdown("## Summary")
-                st.write_stream(chain.stream({"content": content}))
+                # 同じ動画・内容・モデル・プロンプトの要約は、再度 LLM を呼ばずにキャッシュを使う
+                key = summary_key(f"youtube:{YoutubeLoader.extract_video_id(url)}", content, get_model_id(llm), SUMMARIZE_PROMPT)
+                if (summary := summary_cache.get(key)) is not None:
+                    st.write(summary)
+                else:
+                    summary = st.write_stream(chain.stream({"content": content}))
+                    summary_cache.set(key, summary)
                 st.markdown("---")
                 st.markdown("## Original Text")
                 st.write(content)
@@ -1,12 +1,8 @@
 # Github: https://github.com/naotaka1128/llm_app_codes/chapter05/part2/map_reduce.py
 
-import tiktoken
 import traceback
 import streamlit as st
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableLambda
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.runnables import RunnableLambda, RunnableGenerator
 
 # models
 from langchain_openai import ChatOpenAI
@@ -15,6 +11,15 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 from urllib.parse import urlparse
 from langchain_community.document_loaders import YoutubeLoader  # Youtube用
+from src.summarize import SUMMARIZE_PROMPT, MAP_PROMPT, init_summarize_chain
+from src.text_splitter import encode, count_tokens, split_tokens
+from src.dedup import remove_near_duplicates
+from src.youtube_loader import youtube_loader
+from src.parallel_map import run_map, iter_map, MAP_MAX_CONCURRENCY
+from src.tree_reduce import collapse
+from src.chunk_planner import get_model_profile, token_budget, plan_summary, describe_plan
+from src.summary_cache import (
+    summary_cache, summary_key, get_model_id, get_model_name, with_chunk_cache)
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -26,18 +31,6 @@ except ImportError:
 ################################################
 
 
-SUMMARIZE_PROMPT = """以下のコンテンツについて、内容を300文字程度でわかりやすく要約してください。
-
-========
-
-{content}
-
-========
-
-日本語で書いてね！
-"""
-
-
 def init_page():
     st.set_page_config(
         page_title="Youtube Summarizer",
@@ -72,50 +65,100 @@ def select_model(temperature=0):
         )
 
 
-def init_summarize_chain():
-    llm = select_model()
-    prompt = ChatPromptTemplate.from_messages([
-        ("user", SUMMARIZE_PROMPT),
-    ])
-    output_parser = StrOutputParser()
-    return prompt | llm | output_parser
-
-
-def init_chain():
-    summarize_chain = init_summarize_chain()
-
-    text_splitter = \
-        RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            # モデルによってトークン数カウント方法が違うためmodel_nameを指定する
-            # Claude 3 の利用時に正確なトークン数を利用できないことには注意
-            model_name="gpt-3.5-turbo",
-            # チャンクサイズはtoken数でカウント
-            chunk_size=16000,
-            chunk_overlap=0,
+def init_chain(llm):
+    summarize_chain = init_summarize_chain(llm)
+    # チャンクごとの要約は、同じ内容・モデル・プロンプトであればキャッシュを使う
+    map_chain = with_chunk_cache(
+        init_summarize_chain(llm, MAP_PROMPT), summary_cache, get_model_id(llm), MAP_PROMPT)
+    # 同時に要約するチャンクの数 (多すぎると API のレート制限に引っかかりやすくなる)
+    max_concurrency = st.sidebar.slider(
+        "Max concurrency:", min_value=1, max_value=16, value=MAP_MAX_CONCURRENCY)
+    # 長い動画でも待たされている感じがしないように、チャンクの要約を終わった順に表示する
+    stream_partials = st.sidebar.checkbox("Stream partial summaries", value=True)
+
+    # モデルごとのコンテキストウィンドウとトークナイザーに合わせて、1回に渡すトークン数を決める
+    # (Claude / Gemini はトークナイザーが公開されていないので、tiktoken の値を補正して見積もる)
+    profile = get_model_profile(llm)
+    encoding_model = profile["encoding_model"]
+    budget = token_budget(profile)
+    # 1分あたりのトークン数の上限は、同じモデルを使う全てのセッションで共有する
+    rate_limit_key = get_model_name(llm)
+
+    def map_chunks(inputs, config):
+        # 同時実行数・1分あたりのトークン数を制限し、失敗したチャンクはリトライしながら要約する
+        progress = st.progress(0.0, text=f"Summarizing {len(inputs)} chunks ...")
+        results = run_map(
+            map_chain, inputs, config,
+            max_concurrency=max_concurrency, model_name=encoding_model, rate_limit_key=rate_limit_key,
+            on_progress=lambda done, total: progress.progress(
+                done / total, text=f"Summarizing chunks ... ({done}/{total})")
         )
-    text_split = RunnableLambda(
-        lambda x: [
-            {"content": doc} for doc
-            in text_splitter.split_text(x['content'])
-        ]
-    )
+        progress.empty()
+        return results
+
+    def reduce_levels(summaries, config):
+        # 要約を結合したものが長すぎる場合は、1回に渡せる量に収まるまで段階的に並列で要約し直す
+        status = st.empty()
+        summaries, fan_outs = collapse(
+            summarize_chain, summaries, token_budget=budget, config=config,
+            max_concurrency=max_concurrency, model_name=encoding_model,
+            rate_limit_key=rate_limit_key, on_level=lambda level, num_summaries, num_groups: status.caption(
+                f"Reducing (level {level}): {num_summaries} summaries → {num_groups} groups ...")
+        )
+        # 最後の要約 (この後の summarize_chain) も1段として数える
+        fan_outs.append(len(summaries))
+        status.caption(
+            f"Reduce tree: depth {len(fan_outs)}, fan-out {' → '.join(map(str, fan_outs))}")
+        return summaries
+
+    def stream_map_reduce(inputs, config):
+        """
+        チャンクの要約を終わった順に (何番目のチャンクかを付けて) 表示し、最後に全体の要約を出力する
+        チャンクの要約は画面に表示するだけで出力には含めない (出力は全体の要約だけなので、そのままキャッシュできる)
+        """
+        chunks = [chunk for part in inputs for chunk in part]
+        summaries = [None] * len(chunks)
+        partials = st.expander(f"Partial summaries ({len(chunks)} parts)", expanded=True)
+        for index, summary in iter_map(map_chain, chunks, config, max_concurrency=max_concurrency,
+                                       model_name=encoding_model, rate_limit_key=rate_limit_key):
+            summaries[index] = summary
+            partials.markdown(f"**Part {index + 1}/{len(chunks)}:** {summary}")
+        summaries = reduce_levels(summaries, config)
+        yield from summarize_chain.stream({"content": '\n'.join(summaries)}, config)
+
     text_concat = RunnableLambda(
         lambda x: {"content": '\n'.join(x)})
     map_reduce_chain = (
-        text_split
-        | summarize_chain.map()
+        RunnableLambda(map_chunks)
+        | RunnableLambda(reduce_levels)
         | text_concat
         | summarize_chain
     )
+    if stream_partials:
+        map_reduce_chain = RunnableGenerator(stream_map_reduce)
 
     def route(x):
-        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-        token_count = len(encoding.encode(x["content"]))
-        if token_count > 16000:
-            return map_reduce_chain
-        else:
+        # 文章全体を1回だけトークン化し、ルーティングとチャンクの分割の両方に使う
+        tokens = encode(x["content"], model_name=encoding_model)
+        # 1回で要約するか、分割して map-reduce (tree reduce) で要約するかを、
+        # 最も速く終わりそうな方法に決める (同時実行数は所要時間の見積もりにだけ使い、分割は変えない)
+        plan = plan_summary(len(tokens), profile, max_concurrency)
+        st.caption(f"Plan: {describe_plan(plan)}")
+        if plan["mode"] == "single":
             return summarize_chain
 
+        # チャンクサイズはtoken数でカウント (各チャンクのトークン数も map の流量制限に使う)
+        text_split = RunnableLambda(
+            lambda x: [
+                {"content": chunk, "num_tokens": num_tokens} for chunk, num_tokens
+                in split_tokens(
+                    x["content"], chunk_size=plan["chunk_size"],
+                    model_name=encoding_model, tokens=tokens
+                )
+            ]
+        )
+        return text_split | map_reduce_chain
+
     chain = RunnableLambda(route)
 
     return chain
@@ -145,16 +188,13 @@ def get_content(url):
             - author: str
     """
     with st.spinner("Fetching Youtube ..."):
-        loader = YoutubeLoader.from_youtube_url(
-            url,
-            add_video_info=True,  # タイトルや再生数も取得できる
-            language=['en', 'ja']  # 英語→日本語の優先順位で字幕を取得
-        )
-        res = loader.load()  # list of `Document` (page_content, metadata)
         try:
-            if res:
-                content = res[0].page_content
-                title = res[0].metadata['title']
+            # 動画の情報 (タイトルや再生数) と字幕を同時に取得する (英語→日本語の優先順位で字幕を取得)
+            # 一度取得した動画は動画IDごとにキャッシュし、再度リクエストしない
+            document = youtube_loader.load(YoutubeLoader.extract_video_id(url))
+            if document:
+                content = document.page_content
+                title = document.metadata['title']
                 return f"Title: {title}\n\n{content}"
             else:
                 return None
@@ -163,9 +203,20 @@ def get_content(url):
             return None
 
 
+def remove_duplicates(content, model_name="gpt-3.5-turbo"):
+    """ ほぼ同じ内容の区間 (冒頭の挨拶やスポンサーの紹介など) を取り除き、減らせたトークン数を表示する """
+    content, removed = remove_near_duplicates(content)
+    num_tokens = count_tokens("\n".join(removed), model_name) if removed else 0
+    st.caption(f"Near-duplicate segments: {len(removed)} removed ({num_tokens:,} tokens)")
+    return content
+
+
 def main():
     init_page()
-    chain = init_chain()
+    llm = select_model()
+    chain = init_chain(llm)
+    # 重複した区間は要約しても意味がなく料金だけがかかるので、チャンクに分割する前に取り除く
+    dedup = st.sidebar.checkbox("Remove near-duplicate segments", value=True)
 
     # ユーザーの入力を監視
     if url := st.text_input("URL: ", key="input"):
@@ -174,8 +225,19 @@ def main():
             st.write('Please input valid url')
         else:
             if content := get_content(url):
+                if dedup:
+                    content = remove_duplicates(content, get_model_profile(llm)["encoding_model"])
                 st.markdown("## Summary")
-                st.write_stream(chain.stream({"content": content}))
+                # 同じ動画・内容・モデル・プロンプトの要約は、再度 LLM を呼ばずにキャッシュを使う
+                key = summary_key(
+                    f"youtube:{YoutubeLoader.extract_video_id(url)}", content,
+                    get_model_id(llm), MAP_PROMPT, SUMMARIZE_PROMPT)
+                if (summary := summary_cache.get(key)) is not None:
+                    st.write(summary)
+                else:
+                    # chain の出力は最後の要約だけ (チャンクごとの要約は途中経過として別に表示される)
+                    summary = st.write_stream(chain.stream({"content": content}))
+                    summary_cache.set(key, summary)
                 st.markdown("---")
                 st.markdown("## Original Text")
                 st.write(content)
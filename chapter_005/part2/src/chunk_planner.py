@@ -0,0 +1,131 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/chunk_planner.py
+
+import math
+
+from src.parallel_map import MAP_MAX_CONCURRENCY
+
+# モデルごとの設定
+# - context: コンテキストウィンドウのトークン数
+# - encoding_model: トークン数を数えるのに使う tiktoken のモデル名
+# - token_ratio: tiktoken で数えたトークン数に対する、そのモデルの実際のトークン数の比率
+#   (Claude / Gemini のトークナイザーは公開されていないので、実際の課金トークン数から見積もった値)
+# - overhead_sec / prefill_tps / output_tps: レイテンシの見積もりに使う値
+#   (1回の呼び出しの固定の待ち時間, 入力の処理速度, 出力の生成速度 [トークン/秒] のおおよその実測値)
+MODEL_PROFILES = {
+    "gpt-3.5-turbo": {
+        "context": 16385, "encoding_model": "gpt-3.5-turbo", "token_ratio": 1.0,
+        "overhead_sec": 0.5, "prefill_tps": 8000, "output_tps": 80,
+    },
+    "gpt-4o": {
+        "context": 128000, "encoding_model": "gpt-4o", "token_ratio": 1.0,
+        "overhead_sec": 0.6, "prefill_tps": 10000, "output_tps": 60,
+    },
+    "claude-3-5-sonnet-20240620": {
+        "context": 200000, "encoding_model": "gpt-3.5-turbo", "token_ratio": 1.2,
+        "overhead_sec": 1.0, "prefill_tps": 8000, "output_tps": 60,
+    },
+    "gemini-1.5-pro-latest": {
+        "context": 1048576, "encoding_model": "gpt-3.5-turbo", "token_ratio": 1.1,
+        "overhead_sec": 1.5, "prefill_tps": 15000, "output_tps": 50,
+    },
+}
+# 知らないモデルの場合は、最も小さいモデルに合わせておく
+DEFAULT_PROFILE = MODEL_PROFILES["gpt-3.5-turbo"]
+
+# コンテキストウィンドウのうち、入力 (チャンク) に使わずに残しておくトークン数
+# (プロンプトのテンプレートと、300文字程度の要約の出力の分)
+PROMPT_TOKENS = 200
+SUMMARY_TOKENS = 500
+# トークン数の見積もりの誤差に備えて、コンテキストウィンドウを使い切らないようにする
+SAFETY_MARGIN = 0.9
+# これより小さいチャンクには分割しない (小さすぎると要約の質が下がる)
+MIN_CHUNK_SIZE = 2000
+# 要約の方法とチャンクサイズを選ぶときに想定する同時実行数
+# (画面で同時実行数を変えても分割が変わらないように固定する。分割が変わるとチャンクの要約のキャッシュが使えない)
+PLANNING_CONCURRENCY = MAP_MAX_CONCURRENCY
+
+
+def get_model_profile(llm):
+    name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+    # Gemini は 'models/gemini-1.5-pro-latest' のような名前になることがある
+    return MODEL_PROFILES.get(name.split("/")[-1], DEFAULT_PROFILE)
+
+
+def token_budget(profile):
+    """ 1回の呼び出しで渡せる入力のトークン数 (encoding_model で数えた場合) """
+    available = (profile["context"] - PROMPT_TOKENS - SUMMARY_TOKENS) * SAFETY_MARGIN
+    return int(available / profile["token_ratio"])
+
+
+def _call_sec(profile, input_tokens):
+    """ 1回の要約の呼び出しにかかる時間の見積もり """
+    return (profile["overhead_sec"]
+            + input_tokens * profile["token_ratio"] / profile["prefill_tps"]
+            + SUMMARY_TOKENS / profile["output_tps"])
+
+
+def _reduce_fan_outs(num_summaries, budget):
+    """ collapse (tree reduce) と同じように、各段で何件ずつまとめるかを見積もる (最後の要約を含む) """
+    per_call = max(budget // SUMMARY_TOKENS, 2)
+    fan_outs = []
+    while num_summaries > per_call:
+        fan_outs.append(per_call)
+        num_summaries = math.ceil(num_summaries / per_call)
+    fan_outs.append(num_summaries)
+    return fan_outs
+
+
+def _estimate(num_tokens, chunk_size, profile, budget, max_concurrency):
+    num_chunks = math.ceil(num_tokens / chunk_size)
+    fan_outs = _reduce_fan_outs(num_chunks, budget)
+    # map は max_concurrency 件ずつ並列に実行され、reduce は段ごとに並列に実行される
+    latency = math.ceil(num_chunks / max_concurrency) * _call_sec(profile, chunk_size)
+    latency += sum(_call_sec(profile, fan_out * SUMMARY_TOKENS) for fan_out in fan_outs)
+    return {
+        "mode": "tree_reduce" if len(fan_outs) > 1 else "map_reduce",
+        "chunk_size": chunk_size, "num_chunks": num_chunks, "fan_outs": fan_outs,
+        "budget": budget, "est_latency_sec": latency,
+    }
+
+
+def plan_summary(num_tokens, profile, max_concurrency=PLANNING_CONCURRENCY):
+    """
+    モデルのコンテキストウィンドウと速度から、最も速く終わりそうな要約の方法を選ぶ
+
+    - single: 1回の呼び出しで要約する (コンテキストウィンドウに収まる場合)
+    - map_reduce: チャンクごとに並列に要約し、その要約をまとめて要約する
+    - tree_reduce: map_reduce の要約が1回に収まらない場合に、段階的にまとめる
+
+    map_reduce のチャンクサイズは、コンテキストウィンドウいっぱいの場合と、
+    PLANNING_CONCURRENCY 件で並列に処理できる大きさの場合を比較する
+    (num_tokens と chunk_size は、profile の encoding_model で数えたトークン数)
+    方法とチャンクサイズは同じ文書・モデルであれば常に同じになり、
+    max_concurrency (実際の同時実行数) は est_latency_sec の見積もりにだけ使う
+
+    Returns
+    -------
+    Dict[str, Any]: mode, chunk_size, num_chunks, fan_outs, budget, est_latency_sec
+    """
+    budget = token_budget(profile)
+    candidates = []
+    if num_tokens <= budget:
+        candidates.append({
+            "mode": "single", "chunk_size": num_tokens, "num_chunks": 1, "fan_outs": [],
+            "budget": budget, "est_latency_sec": _call_sec(profile, num_tokens),
+        })
+    for chunk_size in {budget, max(math.ceil(num_tokens / PLANNING_CONCURRENCY), MIN_CHUNK_SIZE)}:
+        if chunk_size <= budget and chunk_size < num_tokens:
+            candidates.append(_estimate(num_tokens, chunk_size, profile, budget, PLANNING_CONCURRENCY))
+    plan = min(candidates, key=lambda plan: plan["est_latency_sec"])
+    if plan["mode"] == "single":
+        return plan
+    return _estimate(num_tokens, plan["chunk_size"], profile, budget, max_concurrency)
+
+
+def describe_plan(plan):
+    """ 'map_reduce: 5 chunks × 13,000 tokens, fan-out 5 (est. 12s)' のような説明 """
+    if plan["mode"] == "single":
+        return f"single: {plan['chunk_size']:,} tokens (est. {plan['est_latency_sec']:.0f}s)"
+    return (f"{plan['mode']}: {plan['num_chunks']} chunks × {plan['chunk_size']:,} tokens, "
+            f"fan-out {' → '.join(map(str, plan['fan_outs']))} "
+            f"(est. {plan['est_latency_sec']:.0f}s)")
@@ -0,0 +1,89 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/page_loader.py
+
+import os
+import re
+import codecs
+
+from src.http_cache import http_cache, cached_get
+from src.scheduler import scheduler
+from src.extractors import extract
+
+# 接続と読み込みのタイムアウト (タイムアウトが無いと、応答しないサイトで画面が固まったままになる)
+CONNECT_TIMEOUT_SEC = float(os.environ.get("FETCH_CONNECT_TIMEOUT_SEC", 3.05))
+READ_TIMEOUT_SEC = float(os.environ.get("FETCH_READ_TIMEOUT_SEC", 10))
+
+# ダウンロードするサイズの上限 (これを超える部分は読まずに捨てる)
+# 要約に使うのは本文だけなので、巨大なページを全て読む必要はない
+MAX_DOWNLOAD_BYTES = int(os.environ.get("FETCH_MAX_DOWNLOAD_BYTES", 2 * 1024 * 1024))
+
+# 本文の抽出エンジン (chapter_009 と同じ extractors.py を使う)
+# 既定は lxml で不要な要素 (ナビゲーション・広告・スクリプトなど) を取り除く高速なもの
+PAGE_EXTRACTOR = os.environ.get("PAGE_EXTRACTOR", "lxml")
+
+# 以下の Content-Type と文字コードの判定は chapter_009/src/http_client.py と同じ
+# HTMLとして扱う Content-Type (これ以外は本文を読まずに打ち切る)
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# <meta charset="..."> や <meta http-equiv="Content-Type" content="text/html; charset=..."> を探す
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+class UnsupportedContentType(Exception):
+    """ HTML以外 (PDF・画像・動画など) のレスポンスだった場合の例外 """
+    def __init__(self, content_type):
+        super().__init__(content_type)
+        self.content_type = content_type
+
+
+def _valid_charset(charset):
+    try:
+        return codecs.lookup(charset.decode("ascii") if isinstance(charset, bytes) else charset).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+
+def detect_charset(headers, body):
+    """
+    文字コードを判定する
+
+    1. Content-Type ヘッダーで宣言された charset
+    2. HTML の <meta> タグで宣言された charset
+    3. どちらもなければ utf-8
+    (requests は charset の無い text/* を ISO-8859-1 とみなすため、response.encoding は使わない)
+    """
+    content_type = headers.get("Content-Type", "")
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and (charset := _valid_charset(value.strip("\"' "))):
+            return charset
+    if match := META_CHARSET_PATTERN.search(body[:4096]):
+        if charset := _valid_charset(match.group(1)):
+            return charset
+    return "utf-8"
+
+
+def load_page(url, timeout=(CONNECT_TIMEOUT_SEC, READ_TIMEOUT_SEC),
+              max_bytes=MAX_DOWNLOAD_BYTES, engine=PAGE_EXTRACTOR):
+    """
+    Webページを取得し、LLM に渡す本文を取り出す
+
+    - タイムアウトと、ストリーミングで読むサイズの上限を設ける
+    - Content-Type がHTMLでない場合は本文を読まずに UnsupportedContentType を送出する
+    - 一度取得したページはディスクにキャッシュする (期限切れなら ETag / Last-Modified で再検証する)
+    - 同じサイトへのリクエストが集中しないように、スケジューラで順番待ちしてからリクエストする
+    - ナビゲーション・広告などの本文ではない部分は、LLM に渡す前に取り除く
+
+    Returns
+    -------
+    Tuple[int, str, str]: (ステータスコード, タイトル, 本文) (200 以外の場合はタイトル・本文は None)
+    """
+    status_code, headers, body = cached_get(
+        url, http_cache, timeout=timeout, slot=scheduler.slot, max_bytes=max_bytes,
+        content_types=HTML_CONTENT_TYPES)
+    if status_code != 200:
+        return status_code, None, None
+    if body is None:
+        raise UnsupportedContentType(headers.get("Content-Type"))
+
+    title, content = extract(body.decode(detect_charset(headers, body), errors="replace"), engine)
+    return status_code, title, content
@@ -0,0 +1,175 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/parallel_map.py
+
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.text_splitter import count_tokens
+
+# 同時にLLMを呼び出すチャンクの数の上限
+MAP_MAX_CONCURRENCY = int(os.environ.get("MAP_MAX_CONCURRENCY", 4))
+# 1分あたりに送るトークン数の上限 (API のレート制限に合わせる, 0 の場合は制限しない)
+MAP_TOKENS_PER_MINUTE = int(os.environ.get("MAP_TOKENS_PER_MINUTE", 200000))
+# 1チャンクあたりのリトライ回数と、最初のリトライまでの待ち時間
+MAP_MAX_RETRIES = int(os.environ.get("MAP_MAX_RETRIES", 3))
+MAP_BACKOFF_SEC = float(os.environ.get("MAP_BACKOFF_SEC", 2.0))
+# 要約 (出力) に使われるトークン数の見積もり (300文字程度の要約なので余裕を持たせる)
+OUTPUT_TOKENS_ESTIMATE = 500
+# リトライする HTTP ステータスコード (レート制限・タイムアウト・サーバー側の一時的なエラー)
+# 400 (コンテキスト長の超過など) や 401 / 403 / 404 はリトライしても同じ結果になる
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504, 529)
+# ステータスコードの無い、接続できなかった・タイムアウトしたエラーのクラス名
+# (openai / anthropic の APIConnectionError, APITimeoutError, requests / httpx の例外など)
+RETRYABLE_ERROR_NAMES = ("APIConnectionError", "APITimeoutError", "Timeout", "TimeoutException",
+                         "TimeoutError", "ConnectionError", "ConnectError")
+
+
+class TokenRateLimiter:
+    """
+    1分あたりのトークン数を制限するためのトークンバケット
+
+    `acquire(n)` は n トークン分の枠が空くまで待つ
+    一度に送るトークン数が多いと API のレート制限 (429) に引っかかってリトライが増え、
+    かえって遅くなるため、送る前にペースを調整する
+    """
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self._tokens = tokens_per_minute
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        # バケットの容量より大きいリクエストは、バケットが満杯になった時点で通す
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_sec = (tokens - self._tokens) / self.rate
+            time.sleep(wait_sec)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key, tokens_per_minute=MAP_TOKENS_PER_MINUTE):
+    """
+    key (モデル名) ごとに1つの TokenRateLimiter を返す (tokens_per_minute が 0 の場合は None)
+
+    API のレート制限はモデル (と APIキー) ごとに全てのリクエストで共有されるので、
+    リミッターも呼び出しごとに作らずにプロセス全体で共有する
+    (複数のセッションが同時に要約しても、合計が上限を超えないようにする)
+    """
+    if not tokens_per_minute:
+        return None
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get((key, tokens_per_minute))
+        if limiter is None:
+            limiter = _rate_limiters[(key, tokens_per_minute)] = TokenRateLimiter(tokens_per_minute)
+        return limiter
+
+
+def _status_code(error):
+    """ エラーの HTTP ステータスコード (openai / anthropic は status_code, google は code) """
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        # openai の code は 'context_length_exceeded' のような文字列のことがある
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(error):
+    """ レート制限と一時的なエラー (タイムアウト・接続エラー・5xx) の場合だけリトライする """
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def _retry_after(error):
+    """ レート制限のエラーに Retry-After ヘッダーが付いていればその秒数を返す """
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def invoke_with_retry(chain, input, config=None, max_retries=MAP_MAX_RETRIES,
+                      backoff_sec=MAP_BACKOFF_SEC):
+    """
+    レート制限や一時的なエラーで失敗した場合は、指数バックオフ (+ジッター) で待ってからリトライする
+    (それ以外のエラーはリトライしても同じ結果になるので、すぐに送出する)
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return chain.invoke(input, config)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            wait_sec = _retry_after(e) or backoff_sec * 2 ** attempt
+            time.sleep(wait_sec * random.uniform(1.0, 1.5))
+
+
+def run_map(chain, inputs, config=None, max_concurrency=MAP_MAX_CONCURRENCY,
+            tokens_per_minute=MAP_TOKENS_PER_MINUTE, max_retries=MAP_MAX_RETRIES,
+            model_name="gpt-3.5-turbo", rate_limit_key=None, on_progress=None):
+    """
+    各チャンク ({"content": str, "num_tokens": Optional[int]}) に chain を並列に適用し、
+    入力と同じ順番で結果を返す
+
+    `chain.map()` (= batch) と違い、
+    - 同時実行数を max_concurrency に制限する
+    - 1分あたりのトークン数が tokens_per_minute を超えないように送るペースを調整する
+      (rate_limit_key (既定は model_name) が同じ呼び出しの全体で、1つのリミッターを共有する)
+    - チャンクごとにリトライするので、1つのチャンクが一時的に失敗しても全体が失敗しない
+    - チャンクが終わるたびに on_progress(完了数, 全体の数) を呼ぶ (呼び出し元のスレッドで呼ばれる)
+    """
+    results = [None] * len(inputs)
+    completed = iter_map(chain, inputs, config, max_concurrency=max_concurrency,
+                         tokens_per_minute=tokens_per_minute, max_retries=max_retries,
+                         model_name=model_name, rate_limit_key=rate_limit_key)
+    for done, (index, result) in enumerate(completed, start=1):
+        results[index] = result
+        if on_progress:
+            on_progress(done, len(inputs))
+    return results
+
+
+def iter_map(chain, inputs, config=None, max_concurrency=MAP_MAX_CONCURRENCY,
+             tokens_per_minute=MAP_TOKENS_PER_MINUTE, max_retries=MAP_MAX_RETRIES,
+             model_name="gpt-3.5-turbo", rate_limit_key=None):
+    """
+    run_map と同じように実行し、終わったチャンクから順に (入力のインデックス, 結果) を返すジェネレータ
+    (全てのチャンクが終わるのを待たずに、途中の結果を表示したい場合に使う)
+    """
+    limiter = get_rate_limiter(rate_limit_key or model_name, tokens_per_minute)
+
+    def task(input):
+        if limiter:
+            # 分割時に数えたトークン数 (num_tokens) があればそれを使い、数え直さない
+            num_tokens = input.get("num_tokens") or count_tokens(input["content"], model_name)
+            limiter.acquire(num_tokens + OUTPUT_TOKENS_ESTIMATE)
+        return invoke_with_retry(chain, input, config, max_retries=max_retries)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {executor.submit(task, input): i for i, input in enumerate(inputs)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        except BaseException:
+            # リトライしきれずに失敗した場合や、途中で読むのをやめた場合は、
+            # まだ始まっていないチャンクは実行しない
+            for future in futures:
+                future.cancel()
+            raise
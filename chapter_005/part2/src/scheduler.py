@@ -0,0 +1,149 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/scheduler.py
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 1ドメインあたりの同時リクエスト数の上限と、リクエストを開始する最小の間隔
+MAX_PER_DOMAIN = int(os.environ.get("SCHEDULER_MAX_PER_DOMAIN", 2))
+MIN_INTERVAL_SEC = float(os.environ.get("SCHEDULER_MIN_INTERVAL_SEC", 0.2))
+
+# ドメインごとの設定: ドメイン -> (同時リクエスト数の上限, 最小の間隔)
+# 検索エンジンは短時間に何度もリクエストするとすぐに制限されるので、特に控えめにする
+# YouTube は1本の動画ごとに1つ順番待ちする (その中で動画の情報と字幕の2つのリクエストを同時に行う)
+DOMAIN_LIMITS = {
+    "duckduckgo.com": (1, 1.0),
+    "youtube.com": (4, 0.25),
+}
+
+# 優先度 (小さいほど優先される)
+PRIORITY_INTERACTIVE = 0  # ユーザーが待っているリクエスト
+PRIORITY_BACKGROUND = 10  # 先読みなど、待たせても良いリクエスト
+
+# 待ち時間の統計に使う直近のリクエスト数
+WAIT_SAMPLES = 1000
+
+
+def get_domain(url):
+    """ 'https://www.example.com/path' -> 'example.com' """
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class _DomainState:
+    def __init__(self, max_concurrency, min_interval_sec):
+        self.max_concurrency = max_concurrency
+        self.min_interval_sec = min_interval_sec
+        self.active = 0
+        self.next_start = 0.0
+        self.waiting = []  # (優先度, 到着順) のヒープ
+
+
+class RequestScheduler:
+    """
+    外部サイトへのリクエストを、ドメインごとに順番待ちさせるスケジューラ
+
+    複数のセッションから同時にページを取得すると、同じサイトに短時間で大量のリクエストが集中し、
+    レート制限やアクセス禁止によってかえって遅くなる
+    fetch_page / search_ddg などのリクエストは全てこのスケジューラを通し、
+
+    - ドメインごとの同時リクエスト数を max_concurrency 以下に抑える
+    - ドメインごとにリクエストの開始を min_interval_sec 秒以上空ける
+    - 待っているリクエストは優先度順 (同じ優先度なら到着順) に実行する
+
+    Example:
+    ===============
+    with scheduler.slot(url):
+        requests.get(url)
+    """
+    def __init__(self, max_concurrency=MAX_PER_DOMAIN, min_interval_sec=MIN_INTERVAL_SEC,
+                 domain_limits=DOMAIN_LIMITS):
+        self.max_concurrency = max_concurrency
+        self.min_interval_sec = min_interval_sec
+        self.domain_limits = dict(domain_limits)
+        self._domains = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._requests = 0
+        self._wait_times = deque(maxlen=WAIT_SAMPLES)
+
+    @contextmanager
+    def slot(self, url, priority=PRIORITY_INTERACTIVE):
+        """ 順番が来るまで待ってからリクエストを実行する """
+        domain = get_domain(url)
+        self.acquire(domain, priority)
+        try:
+            yield
+        finally:
+            self.release(domain)
+
+    def acquire(self, domain, priority=PRIORITY_INTERACTIVE):
+        queued_at = time.monotonic()
+        with self._condition:
+            self._prune_idle(queued_at)
+            state = self._domains.get(domain)
+            if state is None:
+                state = self._domains[domain] = _DomainState(*self._limits(domain))
+            entry = (priority, next(self._counter))
+            heapq.heappush(state.waiting, entry)
+            while True:
+                now = time.monotonic()
+                if state.waiting[0] == entry and state.active < state.max_concurrency:
+                    if now >= state.next_start:
+                        break
+                    # 先頭だが間隔が空いていない場合は、間隔が空くまで待つ
+                    self._condition.wait(state.next_start - now)
+                else:
+                    self._condition.wait()
+            heapq.heappop(state.waiting)
+            state.active += 1
+            state.next_start = now + state.min_interval_sec
+            self._requests += 1
+            self._wait_times.append(now - queued_at)
+            # 次に待っているリクエストが先頭になったことを知らせる
+            self._condition.notify_all()
+
+    def release(self, domain):
+        with self._condition:
+            self._domains[domain].active -= 1
+            self._prune_idle(time.monotonic())
+            self._condition.notify_all()
+
+    def _prune_idle(self, now):
+        """
+        使われなくなったドメインの状態を削除する (間隔の制限が残っている間は残す)
+        解放した時点では間隔の制限が残っていたドメインも、次のリクエストや解放のときに削除される
+        """
+        idle = [domain for domain, state in self._domains.items()
+                if not state.active and not state.waiting and state.next_start <= now]
+        for domain in idle:
+            del self._domains[domain]
+
+    def _limits(self, domain):
+        """ サブドメイン (例: lite.duckduckgo.com) には親ドメインの設定を使う """
+        for name, limits in self.domain_limits.items():
+            if domain == name or domain.endswith("." + name):
+                return limits
+        return self.max_concurrency, self.min_interval_sec
+
+    def metrics(self):
+        """ リクエスト数・待っている数・実行中の数と、順番待ちの時間 (秒) の統計 """
+        with self._condition:
+            waits = sorted(self._wait_times)
+            return {
+                "requests": self._requests,
+                "queued": sum(len(s.waiting) for s in self._domains.values()),
+                "active": sum(s.active for s in self._domains.values()),
+                "wait_avg_sec": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95_sec": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "wait_max_sec": waits[-1] if waits else 0.0,
+            }
+
+
+# 全セッションで共有するスケジューラ
+scheduler = RequestScheduler()
@@ -0,0 +1,40 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/summarize.py
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+# map_reduce.py (Streamlit) と batch.py (コマンドライン) で共有するプロンプトとチェーン
+# (batch.py が Streamlit を読み込まなくて済むように、map_reduce.py から分けておく)
+
+SUMMARIZE_PROMPT = """以下のコンテンツについて、内容を300文字程度でわかりやすく要約してください。
+
+========
+
+{content}
+
+========
+
+日本語で書いてね！
+"""
+
+# チャンクごとの要約 (map) に使うプロンプト
+# チャンクごとの要約は最後の要約 (reduce) とは別にキャッシュされるので、SUMMARIZE_PROMPT とは別に書いておく
+# (今は同じ文面だが、SUMMARIZE_PROMPT だけを変えた場合は reduce だけがやり直しになる)
+MAP_PROMPT = """以下のコンテンツについて、内容を300文字程度でわかりやすく要約してください。
+
+========
+
+{content}
+
+========
+
+日本語で書いてね！
+"""
+
+
+def init_summarize_chain(llm, summarize_prompt=SUMMARIZE_PROMPT):
+    prompt = ChatPromptTemplate.from_messages([
+        ("user", summarize_prompt),
+    ])
+    output_parser = StrOutputParser()
+    return prompt | llm | output_parser
@@ -0,0 +1,159 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/summary_cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+from langchain_core.runnables import RunnableLambda
+
+# 要約を保存するディレクトリ
+SUMMARY_CACHE_DIR = os.environ.get("SUMMARY_CACHE_DIR", "./.summary_cache")
+# 保存するサイズの合計の上限 (超えたら最も古く使われたものから削除する)
+SUMMARY_CACHE_MAX_BYTES = int(os.environ.get("SUMMARY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# 保存してからこの秒数が経った要約は使わずに削除する (0 なら無期限)
+SUMMARY_CACHE_TTL_SEC = float(os.environ.get("SUMMARY_CACHE_TTL_SEC", 30 * 24 * 60 * 60))
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def canonical_url(url):
+    """ 同じページを指すURLが同じ文字列になるようにする (スキーム・ホストの小文字化、フラグメントと末尾の / の削除) """
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def get_model_name(llm):
+    """ モデル名 (例: 'gpt-4o') """
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+
+
+def get_model_id(llm):
+    """ キャッシュのキーに使うモデルの識別子 (例: 'ChatOpenAI:gpt-4o:0.0') """
+    return f"{type(llm).__name__}:{get_model_name(llm)}:{getattr(llm, 'temperature', None)}"
+
+
+def summary_key(source_id, content, model_id, *prompts):
+    """ 要約全体のキー: (ソースの識別子, 本文のハッシュ, モデル, プロンプトのハッシュ) """
+    return ("summary", source_id, hash_text(content), model_id, hash_text("\n".join(prompts)))
+
+
+def chunk_key(chunk, model_id, prompt):
+    """
+    チャンクごとの要約 (map) のキー: (チャンクのハッシュ, モデル, map のプロンプトのハッシュ)
+    ソースに依存しないので、同じ内容のチャンクは別のURLから読んだ場合でも使い回せる
+    """
+    return ("chunk", hash_text(chunk), model_id, hash_text(prompt))
+
+
+class SummaryCache:
+    """
+    要約の結果をディスクに保存するキャッシュ
+
+    同じURLや動画が何度も要約されるたびに LLM の料金がかかるのを防ぐ
+    キーにはモデルとプロンプトのハッシュを含めるので、これらを変えた場合は自動的に作り直される
+    map-reduce ではチャンクごとの要約も別に保存するので、reduce のプロンプトだけを変えた場合は
+    reduce だけがやり直しになる
+
+    - 保存するサイズの合計が max_bytes を超えたら、最も古く使われたものから削除する (LRU)
+    - 保存してから ttl_sec 秒が経ったものは使わずに削除する
+
+    1件ごとに `<キーのハッシュ>.json` を保存する
+    """
+    def __init__(self, directory=SUMMARY_CACHE_DIR, max_bytes=SUMMARY_CACHE_MAX_BYTES,
+                 ttl_sec=SUMMARY_CACHE_TTL_SEC):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None  # キーのハッシュ -> サイズ (古く使われた順)
+        self._total_bytes = 0
+
+    def get(self, key):
+        name = hash_text(json.dumps(key))
+        with self._lock:
+            self._load_index()
+            entry = None
+            if name in self._index:
+                try:
+                    with open(self._path(name), encoding="utf-8") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError):
+                    self._remove(name)
+            if entry is not None and self.ttl_sec and time.time() - entry["created_at"] > self.ttl_sec:
+                self._remove(name)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            # 再起動後も最終アクセス順がわかるように、更新時刻をアクセス時刻として使う
+            os.utime(self._path(name))
+            self._index.move_to_end(name)
+            self.hits += 1
+            return entry["summary"]
+
+    def set(self, key, summary):
+        name = hash_text(json.dumps(key))
+        data = json.dumps({"key": list(key), "summary": summary, "created_at": time.time()},
+                          ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._load_index()
+            if name in self._index:
+                self._remove(name)
+            path = self._path(name)
+            # 書き込み途中のファイルを他のプロセスが読まないように、一時ファイルに書いてから置き換える
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._index[name] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._index)))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".json")
+
+    def _load_index(self):
+        """ 初回のみ、ディスク上のキャッシュを最終アクセス順に読み込む """
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, file_name))
+                entries.append((stat.st_mtime, file_name[:-len(".json")], stat.st_size))
+        self._index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._total_bytes = sum(self._index.values())
+
+    def _remove(self, name):
+        self._total_bytes -= self._index.pop(name, 0)
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+def with_chunk_cache(chain, cache, model_id, prompt):
+    """ チャンクの要約 (map) の chain を、キャッシュがあればそれを返すようにする """
+    def invoke(x, config):
+        key = chunk_key(x["content"], model_id, prompt)
+        if (summary := cache.get(key)) is not None:
+            return summary
+        summary = chain.invoke(x, config)
+        cache.set(key, summary)
+        return summary
+    return RunnableLambda(invoke)
+
+
+# 全セッションで共有するキャッシュ
+summary_cache = SummaryCache()
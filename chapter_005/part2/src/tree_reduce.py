@@ -0,0 +1,69 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/tree_reduce.py
+
+from src.text_splitter import count_tokens
+from src.parallel_map import run_map, MAP_MAX_CONCURRENCY, MAP_TOKENS_PER_MINUTE
+
+
+def group_by_token_budget(num_tokens, token_budget):
+    """
+    順番を保ったまま、合計のトークン数が token_budget 以下になるようにインデックスをグループに分ける
+    (1件で token_budget の半分を超えるものは、隣と合わせると収まらないので1件だけのグループになる)
+
+    Example: group_by_token_budget([10, 95, 10, 40], 100) -> [[0], [1], [2, 3]]
+    """
+    groups = []
+    group, group_tokens = [], 0
+    for i, n in enumerate(num_tokens):
+        if group and group_tokens + n > token_budget:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(i)
+        group_tokens += n
+    if group:
+        groups.append(group)
+    return groups
+
+
+def collapse(chain, summaries, token_budget, config=None, max_concurrency=MAP_MAX_CONCURRENCY,
+             tokens_per_minute=MAP_TOKENS_PER_MINUTE, model_name="gpt-3.5-turbo", rate_limit_key=None,
+             on_level=None):
+    """
+    部分的な要約を、結合しても token_budget に収まるまで段階的に要約し直す (tree reduce)
+
+    全ての要約を1つに結合すると、それ自体がコンテキストウィンドウを超えたり遅くなったりするので、
+    token_budget に収まる単位でグループにまとめ、各グループを並列に要約する
+    これを結合したものが token_budget に収まるまで繰り返す (最後の要約は呼び出し元で行う)
+    1件で token_budget の半分を超える要約は、隣と合わせずに1件ずつ要約し直して短くする
+
+    Returns
+    -------
+    Tuple[List[str], List[int]]: (残った要約, 各段のファンアウト (1グループあたりの最大の要約数))
+    """
+    fan_outs = []
+    num_tokens = [count_tokens(s, model_name) for s in summaries]
+    previous_total = None
+    while len(summaries) > 1 and sum(num_tokens) > token_budget:
+        # 要約し直しても短くならない場合は、それ以上まとめられないので終える
+        if previous_total is not None and sum(num_tokens) >= previous_total:
+            break
+        previous_total = sum(num_tokens)
+        groups = group_by_token_budget(num_tokens, token_budget)
+        # 1件だけのグループは要約し直さずに次の段へ持ち越す
+        # (どのグループも1件だけの場合は、それぞれが長すぎるので1件ずつ要約して短くする)
+        targets = [group for group in groups if len(group) > 1] or groups
+        fan_outs.append(max(len(group) for group in targets))
+        if on_level:
+            on_level(len(fan_outs), len(summaries), len(groups))
+        inputs = [
+            {"content": "\n".join(summaries[i] for i in group),
+             "num_tokens": sum(num_tokens[i] for i in group)}
+            for group in targets
+        ]
+        results = dict(zip(map(tuple, targets), run_map(
+            chain, inputs, config, max_concurrency=max_concurrency,
+            tokens_per_minute=tokens_per_minute, model_name=model_name,
+            rate_limit_key=rate_limit_key)))
+        summaries = [results[tuple(group)] if tuple(group) in results else summaries[group[0]]
+                     for group in groups]
+        num_tokens = [count_tokens(s, model_name) for s in summaries]
+    return summaries, fan_outs
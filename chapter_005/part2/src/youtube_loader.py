@@ -0,0 +1,211 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_005/part2/src/youtube_loader.py
+
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+
+from langchain_core.documents import Document
+
+from src.scheduler import scheduler
+
+# 取得した動画の情報と字幕を保存するディレクトリ
+YOUTUBE_CACHE_DIR = os.environ.get("YOUTUBE_CACHE_DIR", "./.youtube_cache")
+# 保存した値を使う期間 (再生数などはすぐに変わるが、字幕はほとんど変わらない)
+VIDEO_INFO_TTL_SEC = float(os.environ.get("YOUTUBE_VIDEO_INFO_TTL_SEC", 24 * 60 * 60))
+TRANSCRIPT_TTL_SEC = float(os.environ.get("YOUTUBE_TRANSCRIPT_TTL_SEC", 30 * 24 * 60 * 60))
+# 同時に読み込む動画の数の上限 (全セッション・全動画で共有する)
+# 1本の動画で情報と字幕の2つのリクエストを同時に行う
+# スケジューラの youtube.com の同時リクエスト数の上限 (DOMAIN_LIMITS) と合わせておく
+YOUTUBE_MAX_WORKERS = int(os.environ.get("YOUTUBE_MAX_WORKERS", 4))
+# 字幕の言語の優先順位 (英語→日本語)
+LANGUAGES = ("en", "ja")
+
+
+def watch_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def fetch_video_info(video_id):
+    """ 動画のタイトルや再生数などを取得する (YoutubeLoader の add_video_info=True と同じ項目) """
+    from pytube import YouTube
+    yt = YouTube(watch_url(video_id))
+    return {
+        "title": yt.title or "Unknown",
+        "description": yt.description or "Unknown",
+        "view_count": yt.views or 0,
+        "thumbnail_url": yt.thumbnail_url or "Unknown",
+        "publish_date": yt.publish_date.strftime("%Y-%m-%d %H:%M:%S")
+        if yt.publish_date else "Unknown",
+        "length": yt.length or 0,
+        "author": yt.author or "Unknown",
+    }
+
+
+def fetch_transcript(video_id, languages=LANGUAGES):
+    """ 字幕を取得して1つのテキストにする (字幕が無効な動画の場合は None) """
+    from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled, YouTubeTranscriptApi
+    try:
+        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+    except TranscriptsDisabled:
+        return None
+    try:
+        transcript = transcript_list.find_transcript(languages)
+    except NoTranscriptFound:
+        transcript = transcript_list.find_transcript(["en"])
+    return " ".join(t["text"].strip(" ") for t in transcript.fetch())
+
+
+class YoutubeCache:
+    """
+    動画の情報と字幕を、動画IDごとにディスクに保存するキャッシュ
+
+    `<動画ID>.<種類>.json` に値と保存した時刻を保存し、種類ごとの期間を過ぎたものは使わない
+    (字幕が無効な動画の None も保存し、何度も問い合わせないようにする)
+    """
+    def __init__(self, directory=YOUTUBE_CACHE_DIR, info_ttl_sec=VIDEO_INFO_TTL_SEC,
+                 transcript_ttl_sec=TRANSCRIPT_TTL_SEC):
+        self.directory = directory
+        self.ttl_sec = {"info": info_ttl_sec, "transcript": transcript_ttl_sec}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, video_id):
+        """ 保存した値があれば (True, 値)、無ければ (False, None) を返す """
+        try:
+            with open(self._path(kind, video_id), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is None or time.time() - entry["stored_at"] > self.ttl_sec[kind]:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, entry["value"]
+
+    def set(self, kind, video_id, value):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(kind, video_id)
+        # 書き込み途中のファイルを他のプロセスが読まないように、一時ファイルに書いてから置き換える
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"value": value, "stored_at": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _path(self, kind, video_id):
+        # 動画IDは英数字と - _ だけなので、そのままファイル名に使える
+        return os.path.join(self.directory, f"{video_id}.{kind}.json")
+
+
+class YoutubeVideoLoader:
+    """
+    YouTube の動画の情報と字幕を同時に取得するローダー
+
+    YoutubeLoader(add_video_info=True) は動画の情報を取得してから字幕を取得するので、
+    2回のリクエストの時間の合計だけ待たされる
+    ここでは2つを並列に取得し、それぞれを動画IDごとにキャッシュする
+
+    - 動画の読み込みは全て共有のスレッドプール (max_workers) で行うので、多数の動画をまとめて読み込んでも
+      同時に読み込む動画は max_workers 本以下になる
+    - 同じ動画を同時に読み込もうとした場合は、実行中の読み込みの結果を待つ (二重にリクエストしない)
+    - slot を指定すると、1本の動画の読み込み (情報と字幕の2つのリクエスト) を `with slot(url):` の中で実行する
+      (既定はスケジューラ。同じ動画の2つのリクエストの間には、スケジューラの間隔の制限を入れない)
+
+    Example:
+    ===============
+    document = youtube_loader.load("dQw4w9WgXcQ")
+    for video_id, document, error in youtube_loader.load_many(video_ids):
+        ...
+    """
+    KINDS = ("info", "transcript")
+
+    def __init__(self, cache=None, max_workers=YOUTUBE_MAX_WORKERS, languages=LANGUAGES,
+                 fetch_info=fetch_video_info, fetch_transcript=fetch_transcript,
+                 slot=scheduler.slot):
+        self.cache = cache or YoutubeCache()
+        self.languages = list(languages)
+        self.fetchers = {
+            "info": fetch_info,
+            "transcript": lambda video_id: fetch_transcript(video_id, self.languages),
+        }
+        self.slot = slot
+        # 動画ごとの読み込みと、その中で同時に行うリクエストは別のスレッドプールで実行する
+        # (読み込みのスレッドはリクエストの完了を待つので、同じプールだと詰まることがある)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="youtube_loader")
+        self._request_executor = ThreadPoolExecutor(max_workers=max_workers * len(self.KINDS),
+                                                    thread_name_prefix="youtube_request")
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, video_id):
+        """ (動画の情報, 字幕) の Future を返す (キャッシュにあればその値、無ければ読み込み中のもの) """
+        # キャッシュの確認も lock の中で行う (_fetch はキャッシュに保存してから _inflight から外すので、
+        # どちらかには必ず見つかり、同じ動画を二重に読み込むことはない)
+        with self._lock:
+            if (future := self._inflight.get(video_id)) is not None:
+                return future
+            values = {}
+            for kind in self.KINDS:
+                found, value = self.cache.get(kind, video_id)
+                if found:
+                    values[kind] = value
+            if len(values) == len(self.KINDS):
+                future = Future()
+                future.set_result((values["info"], values["transcript"]))
+                return future
+            future = self._executor.submit(self._fetch, video_id, values)
+            self._inflight[video_id] = future
+            return future
+
+    def _fetch(self, video_id, values):
+        """ キャッシュに無かったものを同時に取得する """
+        try:
+            with self.slot(watch_url(video_id)) if self.slot else nullcontext():
+                futures = {
+                    kind: self._request_executor.submit(self.fetchers[kind], video_id)
+                    for kind in self.KINDS if kind not in values
+                }
+                for kind, future in futures.items():
+                    values[kind] = future.result()
+            for kind in futures:
+                self.cache.set(kind, video_id, values[kind])
+            return values["info"], values["transcript"]
+        finally:
+            with self._lock:
+                self._inflight.pop(video_id, None)
+
+    def _document(self, video_id, info, transcript):
+        if transcript is None:
+            return None
+        return Document(page_content=transcript, metadata={"source": video_id, **info})
+
+    def load(self, video_id):
+        """
+        動画の情報と字幕を同時に取得し、Document (字幕が無い場合は None) を返す
+
+        Document:
+            - page_content: str (字幕)
+            - metadata: dict (source, title, description, view_count, thumbnail_url,
+                              publish_date, length, author)
+        """
+        return self._document(video_id, *self._submit(video_id).result())
+
+    def load_many(self, video_ids):
+        """
+        複数の動画をまとめて読み込み、(動画ID, Document or None, 例外 or None) を終わった順に返す
+        (1つの動画で失敗しても、他の動画の読み込みは続ける)
+        """
+        pending = {self._submit(video_id): video_id for video_id in dict.fromkeys(video_ids)}
+        for future in as_completed(pending):
+            video_id = pending[future]
+            try:
+                yield video_id, self._document(video_id, *future.result()), None
+            except Exception as e:
+                yield video_id, None, e
+
+
+# 全セッションで共有するローダー
+youtube_loader = YoutubeVideoLoader()
@@ -2,7 +2,7 @@ import fitz  # PyMuPDF
 import streamlit as st
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.text_splitter import split_text
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -44,17 +44,16 @@ def get_pdf_text():
             for page in pdf_doc:
                 pdf_text += page.get_text()
 
-        # RecursiveCharacterTextSplitter でチャンクに分割する
-        # (詳細な説明は第6章をご参照ください)
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name="text-embedding-3-small",
+        # トークン数を基準にチャンクに分割する
+        # (RecursiveCharacterTextSplitter と同じく段落・行・文の区切りを優先して分割する)
+        return split_text(
+            pdf_text,
             # 適切な chunk size は質問対象のPDFによって変わるため調整が必要
             # 大きくしすぎると質問回答時に色々な箇所の情報を参照することができない
             # 逆に小さすぎると一つのchunkに十分なサイズの文脈が入らない
             chunk_size=500,
-            chunk_overlap=0,
+            model_name="text-embedding-3-small"
         )
-        return text_splitter.split_text(pdf_text)
     else:
         return None
 
@@ -0,0 +1,82 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_007/src/text_splitter.py
+
+from bisect import bisect_right
+from functools import lru_cache
+
+import tiktoken
+
+# 区切りの優先順位 (前にあるものほど優先して区切る)
+# 日本語の文章にも対応できるように句点も入れておく
+DEFAULT_SEPARATORS = ("\n\n", "\n", "。", ". ", "、", " ")
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name="gpt-3.5-turbo"):
+    """ tiktoken のエンコーダーはプロセス全体で1つだけ作って使い回す """
+    return tiktoken.encoding_for_model(model_name)
+
+
+def encode(text, model_name="gpt-3.5-turbo"):
+    return get_encoding(model_name).encode(text, disallowed_special=())
+
+
+def count_tokens(text, model_name="gpt-3.5-turbo"):
+    return len(encode(text, model_name))
+
+
+def split_text(text, chunk_size, model_name="gpt-3.5-turbo",
+               separators=DEFAULT_SEPARATORS, tokens=None):
+    """
+    テキストを chunk_size トークン以下のチャンクに分割する
+
+    RecursiveCharacterTextSplitter.from_tiktoken_encoder は区切りごとに
+    何度もトークン数を数え直すが、ここでは全体を1回だけトークン化し、
+    chunk_size トークンの範囲の中で最も優先度の高い区切り (段落 > 行 > 文 > 単語) の位置で切る
+
+    すでにトークン化済みの場合は `tokens` に渡すとトークン化も省略できる
+    """
+    return [chunk for chunk, _ in split_tokens(text, chunk_size, model_name, separators, tokens)]
+
+
+def split_tokens(text, chunk_size, model_name="gpt-3.5-turbo",
+                 separators=DEFAULT_SEPARATORS, tokens=None):
+    """
+    split_text と同じように分割し、(チャンク, トークン数) のリストを返す
+    (トークン数はチャンクの前後の空白の分を含むため、数え直した値より少し多いことがある)
+    """
+    encoding = get_encoding(model_name)
+    if tokens is None:
+        tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= chunk_size:
+        return [(text.strip(), len(tokens))] if text.strip() else []
+
+    # 各トークンがテキストの何文字目から始まるか
+    _, offsets = encoding.decode_with_offsets(tokens)
+    offsets.append(len(text))
+
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + chunk_size, len(tokens))
+        if end < len(tokens):
+            end = _find_break(text, offsets, start, end, separators)
+        chunk = text[offsets[start]:offsets[end]].strip()
+        if chunk:
+            chunks.append((chunk, end - start))
+        start = end
+    return chunks
+
+
+def _find_break(text, offsets, start, end, separators):
+    """ [start, end) のトークンの範囲で、最も優先度の高い区切りの直後のトークン位置を返す """
+    begin_char, end_char = offsets[start], offsets[end]
+    for separator in separators:
+        position = text.rfind(separator, begin_char, end_char)
+        if position <= begin_char:
+            continue
+        # 区切りの直後の文字を含むトークンの位置 (区切りはこのチャンクに含める)
+        index = bisect_right(offsets, position + len(separator), start, end) - 1
+        if index > start and offsets[index] > begin_char:
+            return index
+    # 区切りが見つからない場合は chunk_size トークンでそのまま切る
+    return end
@@ -1,7 +1,6 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/main.py
 import streamlit as st
 from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain.memory import ConversationBufferWindowMemory
 from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_community.callbacks import StreamlitCallbackHandler
@@ -14,6 +13,12 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 # custom tools
 from tools.search_ddg import search_ddg
 from tools.fetch_page import fetch_page
+from tools.fetch_pages import fetch_pages
+
+# memory
+from src.memory import TokenBudgetMemory
+from src.prefetch import prefetcher
+from src.scheduler import scheduler
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -33,6 +38,7 @@ CUSTOM_SYSTEM_PROMPT = """
 検索結果ページを見ただけでは情報があまりないと思われる場合は、次の2つのオプションを検討して試してみてください。
 
 - 検索結果のリンクをクリックして、各ページのコンテンツにアクセスし、読んでみてください。
+  - 複数のページを読む場合は、`fetch_pages` ツールで一度にまとめて取得してください。
 - 1ページが長すぎる場合は、3回以上ページ送りしないでください（メモリの負荷がかかるため）。
 - 検索クエリを変更して、新しい検索を実行してください。
 - 検索する内容に応じて検索に利用する言語を適切に変更してください。
@@ -72,10 +78,10 @@ def init_messages():
         st.session_state.messages = [
             {"role": "assistant", "content": "こんにちは！なんでも質問をどうぞ！"}
         ]
-        st.session_state['memory'] = ConversationBufferWindowMemory(
+        st.session_state['memory'] = TokenBudgetMemory(
             return_messages=True,
             memory_key="chat_history",
-            k=10
+            max_token_limit=2000
         )
 
         # このようにも書ける
@@ -102,7 +108,7 @@ def select_model():
 
 
 def create_agent():
-    tools = [search_ddg, fetch_page]
+    tools = [search_ddg, fetch_page, fetch_pages]
     prompt = ChatPromptTemplate.from_messages([
         ("system", CUSTOM_SYSTEM_PROMPT),
         MessagesPlaceholder(variable_name="chat_history"),
@@ -110,6 +116,8 @@ def create_agent():
         MessagesPlaceholder(variable_name="agent_scratchpad")
     ])
     llm = select_model()
+    # 古い会話の要約にも選択中のモデルを使う (OpenAI 以外のモデルでは OpenAI の API キーを不要にする)
+    st.session_state['memory'].llm = llm
     agent = create_tool_calling_agent(llm, tools, prompt)
     return AgentExecutor(
         agent=agent,
@@ -124,6 +132,20 @@ def main():
     init_messages()
     web_browsing_agent = create_agent()
 
+    if prefetcher.top_k:
+        # 検索結果の先読みが有効な場合 (PREFETCH_TOP_K) は、その効果を表示する
+        m = prefetcher.metrics()
+        st.sidebar.caption(
+            f"Prefetch: hit rate {m['hit_rate']:.0%} ({m['hits']}/{m['prefetched']}), "
+            f"wasted {m['wasted_bytes'] / 1024:.0f} KiB, unread {m['pending_bytes'] / 1024:.0f} KiB"
+        )
+    # 外部サイトへのリクエストの順番待ちの時間 (サイトごとの同時接続数・間隔の制限による)
+    m = scheduler.metrics()
+    st.sidebar.caption(
+        f"Fetch queue: {m['queued']} waiting, "
+        f"wait avg {m['wait_avg_sec'] * 1000:.0f} ms / p95 {m['wait_p95_sec'] * 1000:.0f} ms"
+    )
+
     for msg in st.session_state['memory'].chat_memory.messages:
         st.chat_message(msg.type).write(msg.content)
 
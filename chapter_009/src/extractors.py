@@ -0,0 +1,170 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/src/extractors.py
+
+import os
+import re
+import warnings
+
+import lxml.html
+import html2text
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+from readability import Document
+
+# 利用する抽出エンジン (デプロイ先ごとに環境変数で切り替えられる)
+# - readability: readability で本文を推定し html2text で Markdown にする (精度重視・遅い)
+# - lxml: lxml で不要な要素を取り除き、main/article/body のテキストを取り出す (速い)
+# - bs4: BeautifulSoup (lxml パーサー) で main/article/body のテキストを取り出す
+DEFAULT_EXTRACTOR = os.environ.get("HTML_EXTRACTOR", "readability")
+
+# 本文ではない (ナビゲーション・広告・スクリプトなど) 可能性が高い要素
+BOILERPLATE_TAGS = (
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas",
+    "nav", "header", "footer", "aside", "form", "button",
+)
+# 前後に改行を入れるブロック要素
+BLOCK_TAGS = (
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "table", "tr",
+    "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "dt", "dd",
+)
+HEADING_LEVELS = {f"h{i}": i for i in range(1, 7)}
+# ページのテキストのこの割合以上を含む要素は、class / id のヒントに一致してもページ全体を囲む要素とみなす
+WRAPPER_TEXT_RATIO = 0.5
+
+# class / id から本文ではないと推定できる要素 (div で組まれたブログのサイドバーなど)
+BOILERPLATE_HINT = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|sidebar|footer|breadcrumbs?|share|social|related|"
+    r"comments?|ads?|ad-slot|banner|topbar|toc|prev-next|pager|archives?|cookie)([\s_-]|$)",
+    re.IGNORECASE)
+# class / id から本文と推定できる要素 (article / main が無いページ用)
+CONTENT_HINT = re.compile(
+    r"(^|[\s_-])(content|entry|post|article|body|document)([\s_-]|$)", re.IGNORECASE)
+
+# XHTML のページを lxml パーサーで読む際の警告は無視する
+warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+
+_html_parser = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+
+def normalize_text(text):
+    """ 行ごとの余分な空白と、連続する空行を取り除く """
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _is_page_level(tag, ancestors):
+    """ header / footer は記事の中にあるもの (記事のタイトルなど) は残す """
+    return tag not in ("header", "footer") or not any(
+        a in ("article", "main") for a in ancestors)
+
+
+def _hints(element):
+    return f"{element.get('class', '')} {element.get('id', '')}"
+
+
+def _content_candidates(tree):
+    """
+    本文の可能性が高い要素 (article / main)
+    無ければ class / id が本文らしい要素 (ただし comment-body のように本文ではないヒントも含むものは除く)
+    """
+    candidates = tree.xpath("//article|//main|//*[@role='main']")
+    if not candidates:
+        candidates = [
+            e for e in tree.xpath("//*[@class or @id]")
+            if CONTENT_HINT.search(_hints(e)) and not BOILERPLATE_HINT.search(_hints(e))
+        ]
+    return candidates
+
+
+def extract_with_readability(html):
+    doc = Document(html)
+    return doc.title(), html2text.html2text(doc.summary())
+
+
+def extract_with_lxml(html):
+    # str のまま渡すと <?xml encoding=...?> 宣言があるページで失敗するので bytes にして渡す
+    tree = lxml.html.fromstring(html.encode("utf-8"), parser=_html_parser)
+    title = (tree.findtext(".//title") or "").strip()
+
+    # 本文の候補と、それを含む要素 (html / body や、ページ全体を囲む div など) は取り除かない
+    # 候補が無いページでも、ページのテキストの大部分を含む要素は取り除かない
+    # (例: WordPress の <body class="... showing-comments footer-top-visible"> や
+    #  <div class="container has-sidebar"> は、ヒントに一致しても本文を含んでいる)
+    candidates = _content_candidates(tree)
+    protected = set(candidates)
+    for candidate in candidates:
+        protected.update(candidate.iterancestors())
+
+    for element in list(tree.iter(*BOILERPLATE_TAGS)):
+        if element not in protected and _is_page_level(
+                element.tag, (a.tag for a in element.iterancestors())):
+            element.drop_tree()
+    page_text_len = len(tree.text_content())
+    for element in tree.xpath("//*[@class or @id]"):
+        if element.tag in ("html", "body") or element in protected:
+            continue
+        # 記事の中の header (タイトルなど) は、class が header-footer-group のようなものでも残す
+        if element.tag == "header" and not _is_page_level(
+                element.tag, (a.tag for a in element.iterancestors())):
+            continue
+        if BOILERPLATE_HINT.search(_hints(element)) and \
+                len(element.text_content()) < page_text_len * WRAPPER_TEXT_RATIO:
+            element.drop_tree()
+
+    # なるべく本文の可能性が高い要素 (テキストが最も長いもの) を使い、無ければ body を使う
+    # (候補の中にあった本文ではない要素は取り除いたので、もう一度探す)
+    candidates = _content_candidates(tree)
+    if candidates:
+        root = max(candidates, key=lambda e: len(e.text_content()))
+    else:
+        root = next(iter(tree.iter("body")), tree)
+
+    # コードブロックは空白 (インデント) を保ったまま、Markdown のコードブロックにする
+    code_blocks = []
+    for element in list(root.iter("pre")):
+        code_blocks.append("```\n" + element.text_content().strip("\n") + "\n```")
+        placeholder = lxml.html.Element("p")
+        placeholder.text = f"\ue000{len(code_blocks) - 1}\ue000"
+        placeholder.tail = element.tail
+        element.getparent().replace(element, placeholder)
+
+    # 見出しは Markdown の見出しにして、ブロック要素の前後には改行を入れる
+    for element in root.iter(*BLOCK_TAGS):
+        if level := HEADING_LEVELS.get(element.tag):
+            element.text = "#" * level + " " + (element.text or "")
+        element.text = "\n" + (element.text or "")
+        element.tail = "\n" + (element.tail or "")
+    content = normalize_text(root.text_content())
+    content = re.sub("\ue000(\\d+)\ue000", lambda m: code_blocks[int(m.group(1))], content)
+    return title, content
+
+
+def extract_with_bs4(html):
+    soup = BeautifulSoup(html, "lxml")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    for element in soup(BOILERPLATE_TAGS):
+        if not element.decomposed and _is_page_level(
+                element.name, (a.name for a in element.parents)):
+            element.decompose()
+    candidates = soup(["article", "main"])
+    if candidates:
+        root = max(candidates, key=lambda e: len(e.get_text()))
+    else:
+        root = soup.body or soup
+    return title, normalize_text(root.get_text("\n"))
+
+
+EXTRACTORS = {
+    "readability": extract_with_readability,
+    "lxml": extract_with_lxml,
+    "bs4": extract_with_bs4,
+}
+
+
+def extract(html, engine=None):
+    """
+    HTMLからタイトルと本文のテキストを取り出す
+
+    Returns
+    -------
+    Tuple[str, str]: (title, content)
+    """
+    return EXTRACTORS[engine or DEFAULT_EXTRACTOR](html)
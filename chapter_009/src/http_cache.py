@@ -0,0 +1,314 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/src/http_cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# キャッシュを保存するディレクトリと、保存するサイズの合計の上限
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", "./.http_cache")
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Cache-Control / Expires が無い場合は、最終更新からの経過時間の10%を有効期限とみなす (RFC 9111 4.2.2)
+HEURISTIC_FRESHNESS_RATIO = 0.1
+MAX_HEURISTIC_FRESHNESS_SEC = 24 * 60 * 60
+
+# max_bytes を指定した場合に、1回に読み込むサイズ
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# 保存しておくレスポンスヘッダー
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Expires", "Date", "Age")
+
+
+def parse_cache_control(value):
+    """ 'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': None} """
+    directives = {}
+    for part in (value or "").split(","):
+        key, _, arg = part.strip().partition("=")
+        if key:
+            directives[key.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+def _parse_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, now=None):
+    """
+    レスポンスヘッダーから、レスポンスを再検証せずに使える秒数を求める
+
+    1. Cache-Control の no-cache / no-store -> 0 (毎回再検証する)
+    2. Cache-Control の max-age
+    3. Expires
+    4. Last-Modified からの推定
+    (Age ヘッダーの分は差し引く)
+    """
+    now = now or time.time()
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives or "no-store" in directives:
+        return 0.0
+
+    date = _parse_date(headers.get("Date")) or now
+    age = str(headers.get("Age") or "0")
+    age = float(age) if age.isdigit() else 0.0
+    if (max_age := directives.get("max-age")) is not None and max_age.isdigit():
+        lifetime = float(max_age)
+    elif (expires := headers.get("Expires")) is not None:
+        # 不正な Expires (例: "0") は期限切れとして扱う
+        lifetime = (_parse_date(expires) or 0) - date
+    elif last_modified := _parse_date(headers.get("Last-Modified")):
+        lifetime = min((date - last_modified) * HEURISTIC_FRESHNESS_RATIO,
+                       MAX_HEURISTIC_FRESHNESS_SEC)
+    else:
+        lifetime = 0.0
+    return max(lifetime - age, 0.0)
+
+
+class HTTPCache:
+    """
+    HTTPレスポンスをディスクに保存するキャッシュ
+
+    再起動やユーザーをまたいで、同じページを何度もダウンロードしないようにする
+
+    - Cache-Control (max-age / no-cache / no-store) と Expires に従い、有効期限内であればそのまま使う
+    - 期限切れでも ETag / Last-Modified があれば条件付きリクエストで再検証し、
+      304 Not Modified であれば保存済みの body を使う (body の転送が不要になる)
+    - 保存するサイズの合計が max_bytes を超えたら、最も古く使われたものから削除する (LRU)
+
+    1件ごとに `<URLのハッシュ>.json` (メタデータ) と `<URLのハッシュ>.body` を保存する
+    """
+    def __init__(self, directory=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0  # 有効期限内でそのまま使えた
+        self.revalidated = 0  # 304 で再利用できた
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None  # key -> サイズ (古く使われた順)
+        self._total_bytes = 0
+
+    def get(self, url):
+        """ 保存済みの (メタデータ, body) を返す (無ければ None) """
+        key = self._key(url)
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            try:
+                with open(self._path(key, "json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(self._path(key, "body"), "rb") as f:
+                    body = f.read()
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            # 再起動後も最終アクセス順がわかるように、更新時刻をアクセス時刻として使う
+            os.utime(self._path(key, "body"))
+            self._index.move_to_end(key)
+            return meta, body
+
+    def is_fresh(self, meta):
+        return time.time() < meta["expires_at"]
+
+    def validators(self, meta):
+        """ 再検証のための条件付きリクエストのヘッダー """
+        headers = {}
+        if etag := meta["headers"].get("ETag"):
+            headers["If-None-Match"] = etag
+        if last_modified := meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def store(self, url, headers, body, complete=True):
+        """
+        200 のレスポンスを保存する (no-store の場合は保存しない)
+        サイズの上限で途中までしか読んでいない場合は complete=False を指定する
+        """
+        if "no-store" in parse_cache_control(headers.get("Cache-Control")):
+            return
+        if len(body) > self.max_bytes:
+            return
+        meta = {
+            "url": url,
+            "headers": {k: headers[k] for k in STORED_HEADERS if k in headers},
+            "stored_at": time.time(),
+            "expires_at": time.time() + freshness_lifetime(headers),
+            "complete": complete,
+        }
+        key = self._key(url)
+        with self._lock:
+            self._load_index()
+            if key in self._index:
+                self._remove(key)
+            self._write(self._path(key, "body"), body)
+            self._write(self._path(key, "json"), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            self._index[key] = len(body)
+            self._total_bytes += len(body)
+            while self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._index)))
+
+    def refresh(self, url, meta, headers):
+        """ 304 Not Modified を受け取った場合に、新しいヘッダーで有効期限を更新する """
+        merged = {**meta["headers"], **{k: headers[k] for k in STORED_HEADERS if k in headers}}
+        meta = {**meta, "headers": merged, "expires_at": time.time() + freshness_lifetime(merged)}
+        key = self._key(url)
+        with self._lock:
+            self._load_index()
+            if key in self._index:
+                self._write(self._path(key, "json"), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        return meta
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def _write(self, path, data):
+        # 書き込み途中のファイルを他のプロセスが読まないように、一時ファイルに書いてから置き換える
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _load_index(self):
+        """ 初回のみ、ディスク上のキャッシュを最終アクセス順に読み込む """
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".body"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-len(".body")], stat.st_size))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total_bytes = sum(self._index.values())
+
+    def _remove(self, key):
+        self._total_bytes -= self._index.pop(key, 0)
+        for ext in ("json", "body"):
+            try:
+                os.remove(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+
+def iter_body(response, chunk_size=DOWNLOAD_CHUNK_BYTES):
+    """
+    body を届いた分から順に返す (stream=True で取得したレスポンス)
+    urllib3 2 以降では chunk_size 分が届くのを待たずに返すので、少しずつ送ってくるサーバーでも
+    読み込みの途中で経過時間を確認できる
+    """
+    if hasattr(response.raw, "read1"):
+        while chunk := response.raw.read1(chunk_size, decode_content=True):
+            yield chunk
+    else:
+        yield from response.iter_content(chunk_size=chunk_size)
+
+
+def read_body(response, max_bytes=None, deadline=None):
+    """
+    レスポンスの body を読み、(body, 最後まで読んだかどうか) を返す
+    max_bytes を指定すると、ストリーミングで読み、それを超える部分は読まずに打ち切る
+    deadline (time.monotonic() の時刻) を指定すると、それまでに読み終わらない場合は
+    requests.exceptions.Timeout を送出する
+    (requests の読み込みのタイムアウトは1回の読み込みごとなので、少しずつ送ってくるサーバーには効かない)
+    """
+    if max_bytes is None and deadline is None:
+        return response.content, True
+    body = bytearray()
+    for chunk in iter_body(response):
+        body.extend(chunk)
+        if max_bytes is not None and len(body) >= max_bytes:
+            return bytes(body[:max_bytes]), False
+        if deadline is not None and time.monotonic() > deadline:
+            raise requests.exceptions.Timeout(f"download did not finish in time: {response.url}")
+    return bytes(body), True
+
+
+def accepts_content_type(headers, content_types):
+    """ Content-Type (無い場合は text/html とみなす) が content_types のいずれかか (None なら全て受け付ける) """
+    if content_types is None:
+        return True
+    content_type = headers.get("Content-Type", "text/html")
+    return content_type.split(";")[0].strip().lower() in content_types
+
+
+def cached_get(url, cache, session=requests, timeout=None, slot=None, max_bytes=None,
+               content_types=None, total_timeout=None, **kwargs):
+    """
+    キャッシュを使って GET し、(ステータスコード, ヘッダー, body) を返す
+    (ヘッダーはキャッシュを使った場合も requests と同じく大文字・小文字を区別しない CaseInsensitiveDict)
+
+    - 有効期限内のキャッシュがあればリクエストしない
+    - 期限切れであれば条件付きリクエストで再検証する
+    - 200 のレスポンスはキャッシュに保存する
+    - slot を指定すると、実際にリクエストする場合だけ `with slot(url):` の中で実行する
+      (例: `slot=scheduler.slot` でサイトごとの順番待ちをする)
+    - max_bytes を指定すると、body はストリーミングで読み、それを超える部分は読まずに捨てる
+      (途中までしか保存していないキャッシュは、より多くを読みたい場合には使わない)
+    - content_types を指定すると、Content-Type がそれ以外のレスポンスは body を読まずに (キャッシュにも保存せず)
+      body を None として返す (例: HTML以外の PDF や動画を最後までダウンロードしない)
+    - total_timeout を指定すると、リクエストを送ってから body を読み終えるまでの合計の秒数がそれを超えた場合に
+      requests.exceptions.Timeout を送出する (timeout は接続と1回の読み込みごとのタイムアウト)
+    """
+    if cached := cache.get(url):
+        meta, body = cached
+        if not meta["complete"] and (max_bytes is None or len(body) < max_bytes):
+            cached = None
+        elif cache.is_fresh(meta):
+            cache.hits += 1
+            headers = CaseInsensitiveDict(meta["headers"])
+            if not accepts_content_type(headers, content_types):
+                return 200, headers, None
+            return 200, headers, body[:max_bytes]
+        else:
+            kwargs["headers"] = {**kwargs.get("headers", {}), **cache.validators(meta)}
+
+    stream = max_bytes is not None or content_types is not None or total_timeout is not None
+    with slot(url) if slot else nullcontext():
+        deadline = time.monotonic() + total_timeout if total_timeout is not None else None
+        with session.get(url, timeout=timeout, stream=stream, **kwargs) as response:
+            return _handle_response(url, cache, response, cached, max_bytes, content_types, deadline)
+
+
+def _handle_response(url, cache, response, cached, max_bytes, content_types, deadline):
+    """ cached_get の、リクエストした後の処理 (cached は再検証に使ったキャッシュの (meta, body)) """
+    if response.status_code == 304 and cached:
+        meta, body = cached
+        cache.revalidated += 1
+        meta = cache.refresh(url, meta, response.headers)
+        headers = CaseInsensitiveDict(meta["headers"])
+        if not accepts_content_type(headers, content_types):
+            return 200, headers, None
+        return 200, headers, body[:max_bytes]
+
+    cache.misses += 1
+    headers = CaseInsensitiveDict(response.headers)
+    if response.status_code == 200 and not accepts_content_type(headers, content_types):
+        return response.status_code, headers, None
+    body, complete = read_body(response, max_bytes, deadline)
+    if response.status_code == 200:
+        cache.store(url, headers, body, complete=complete)
+    return response.status_code, headers, body
+
+
+# 全セッションで共有するキャッシュ
+http_cache = HTTPCache()
@@ -0,0 +1,153 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/src/http_client.py
+
+import os
+import re
+import codecs
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.http_cache import http_cache, cached_get
+from src.scheduler import scheduler, PRIORITY_INTERACTIVE
+
+# 接続 (TCP/TLS ハンドシェイク) と読み込みのタイムアウトは別々に設定できる
+# 接続が遅いサイトはたいてい落ちているので、接続のタイムアウトは短めにしておく
+CONNECT_TIMEOUT_SEC = float(os.environ.get("FETCH_CONNECT_TIMEOUT_SEC", 3.05))
+READ_TIMEOUT_SEC = float(os.environ.get("FETCH_READ_TIMEOUT_SEC", 10))
+
+# コネクションプールの設定
+# - POOL_CONNECTIONS: コネクションを保持しておくホストの数
+# - POOL_MAXSIZE: 1ホストあたりに同時に張るコネクション数の上限
+POOL_CONNECTIONS = int(os.environ.get("FETCH_POOL_CONNECTIONS", 32))
+POOL_MAXSIZE = int(os.environ.get("FETCH_POOL_MAXSIZE", 4))
+
+# ダウンロードするサイズの上限 (これを超える部分は読まずに捨てる)
+# fetch_page で読むのは先頭の数チャンクだけなので、巨大なページを全て読む必要はない
+MAX_DOWNLOAD_BYTES = int(os.environ.get("FETCH_MAX_DOWNLOAD_BYTES", 2 * 1024 * 1024))
+
+# 1ページのダウンロード全体にかける時間の上限
+# 読み込みのタイムアウトは1回の読み込みごとなので、少しずつ送ってくるサーバーでは効かない
+MAX_DOWNLOAD_SEC = float(os.environ.get("FETCH_MAX_DOWNLOAD_SEC", 20))
+
+# HTMLとして扱う Content-Type (これ以外は本文を読まずに打ち切る)
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# <meta charset="..."> や <meta http-equiv="Content-Type" content="text/html; charset=..."> を探す
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+try:
+    import brotli  # noqa: F401 (インストールされていれば urllib3 が br を展開できる)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; WebBrowsingAgent/1.0)",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "Connection": "keep-alive",
+}
+
+# 全スレッドで1つのアダプタ (= コネクションプール) を共有する
+# pool_block=True にすると、1ホストあたり POOL_MAXSIZE を超える接続は空くまで待つ
+_adapter = HTTPAdapter(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+    pool_block=True,
+)
+_local = threading.local()
+
+
+def get_session():
+    """
+    コネクションプールを共有した requests.Session を返す
+
+    requests.Session 自体はスレッドセーフが保証されていないため、Session はスレッドごとに作り、
+    コネクションプール (HTTPAdapter) だけを全スレッドで共有する
+    同じサイトのページを続けて読む場合は keep-alive で接続が再利用されるので、
+    TCP/TLS のハンドシェイクが毎回発生しない
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.mount("http://", _adapter)
+        session.mount("https://", _adapter)
+        _local.session = session
+    return session
+
+
+def get_timeout(read_timeout_sec=None):
+    """ requests に渡す (接続タイムアウト, 読み込みタイムアウト) を返す """
+    return (CONNECT_TIMEOUT_SEC, read_timeout_sec or READ_TIMEOUT_SEC)
+
+
+class UnsupportedContentType(Exception):
+    """ HTML以外 (PDF・画像・動画など) のレスポンスだった場合の例外 """
+    def __init__(self, content_type):
+        super().__init__(content_type)
+        self.content_type = content_type
+
+
+def _valid_charset(charset):
+    try:
+        return codecs.lookup(charset.decode("ascii") if isinstance(charset, bytes) else charset).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+
+def detect_charset(headers, body):
+    """
+    文字コードを判定する
+
+    1. Content-Type ヘッダーで宣言された charset
+    2. HTML の <meta> タグで宣言された charset
+    3. どちらもなければ utf-8
+    (requests は charset の無い text/* を ISO-8859-1 とみなすため、response.encoding は使わない)
+    """
+    content_type = headers.get("Content-Type", "")
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and (charset := _valid_charset(value.strip("\"' "))):
+            return charset
+    if match := META_CHARSET_PATTERN.search(body[:4096]):
+        if charset := _valid_charset(match.group(1)):
+            return charset
+    return "utf-8"
+
+
+def download_html(url, timeout_sec=None, max_bytes=MAX_DOWNLOAD_BYTES, priority=PRIORITY_INTERACTIVE,
+                  total_timeout_sec=MAX_DOWNLOAD_SEC):
+    """
+    HTMLページをストリーミングでダウンロードし、(ステータスコード, テキスト, 最後まで読んだかどうか) を返す
+
+    - Content-Type がHTMLでない場合は本文を読まずに UnsupportedContentType を送出する
+    - max_bytes を超える部分は読まずに打ち切る (巨大なページでメモリを使いすぎないため)
+    - total_timeout_sec 以内に読み終わらない場合は requests.exceptions.Timeout を送出する
+    - 宣言された文字コードでデコードする (不正なバイトは置き換える)
+    - ステータスコードが200以外の場合はテキストは None
+    - max_bytes で打ち切った場合は、最後まで読んだかどうかが False になる
+      (ちょうど max_bytes のページも、途中までとみなす)
+    - レスポンスはディスクにキャッシュし、有効期限内ならダウンロードせず、
+      期限切れなら ETag / Last-Modified で再検証する (src/http_cache.py の cached_get)
+    - 同じサイトへのリクエストが集中しないように、スケジューラで順番待ちしてからリクエストする
+    """
+    status, headers, body = cached_get(
+        url, http_cache,
+        session=get_session(),
+        timeout=get_timeout(timeout_sec),
+        slot=lambda u: scheduler.slot(u, priority),
+        max_bytes=max_bytes,
+        content_types=HTML_CONTENT_TYPES,
+        total_timeout=total_timeout_sec,
+    )
+    if status != 200:
+        return status, None, True
+    if body is None:
+        raise UnsupportedContentType(headers.get("Content-Type"))
+    return status, _decode(headers, body), len(body) < max_bytes
+
+
+def _decode(headers, body):
+    return body.decode(detect_charset(headers, body), errors="replace")
@@ -0,0 +1,76 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/src/page_cache.py
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+PAGE_CACHE_TTL_SEC = float(os.environ.get("PAGE_CACHE_TTL_SEC", 600))
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class PageCache:
+    """
+    URLごとに、パース・分割済みのページ (タイトルとチャンクのリスト) を保持するキャッシュ
+
+    fetch_page で page_num を 0, 1, 2... と読み進める際に、
+    毎回ダウンロード・パース・分割をやり直さなくて済むようにする
+
+    - ttl_sec を過ぎたエントリは使わない
+    - 保持するテキストの合計サイズが max_bytes を超えたら、最も古く使われたものから削除する (LRU)
+    """
+    def __init__(self, ttl_sec=PAGE_CACHE_TTL_SEC, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # url -> (保存時刻, サイズ, ページ)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            saved_at, size, page = entry
+            if time.monotonic() - saved_at > self.ttl_sec:
+                self._remove(url)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return page
+
+    def __contains__(self, url):
+        """ 有効なエントリがあるかどうか (ヒット率の集計には含めない) """
+        with self._lock:
+            entry = self._entries.get(url)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl_sec
+
+    def set(self, url, page):
+        size = len(page["title"].encode("utf-8")) + sum(
+            len(chunk.encode("utf-8")) for chunk in page["chunks"])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if url in self._entries:
+                self._remove(url)
+            self._entries[url] = (time.monotonic(), size, page)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove(self, url):
+        _, size, _ = self._entries.pop(url)
+        self._total_bytes -= size
+
+
+# 全セッションで共有するキャッシュ
+page_cache = PageCache()
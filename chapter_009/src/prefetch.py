@@ -0,0 +1,129 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/src/prefetch.py
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from src.page_cache import page_cache
+from src.scheduler import PRIORITY_BACKGROUND
+
+# 検索結果の上位何件を先読みするか (0 の場合は先読みしない)
+PREFETCH_TOP_K = int(os.environ.get("PREFETCH_TOP_K", 0))
+# 先読みを同時に行う数の上限
+PREFETCH_MAX_WORKERS = int(os.environ.get("PREFETCH_MAX_WORKERS", 4))
+# 先読みでダウンロードする1ページあたりのサイズの上限
+# (fetch_page で読まれるのは先頭の数チャンクだけなので、通常より小さくしておく)
+PREFETCH_MAX_BYTES = int(os.environ.get("PREFETCH_MAX_BYTES", 512 * 1024))
+# fetch_page が実行中の先読みの完了を待つ時間の上限
+# (先読みは低い優先度で順番待ちしているので、待ちきれない場合は fetch_page が通常の優先度で取得する)
+PREFETCH_CLAIM_TIMEOUT_SEC = float(os.environ.get("PREFETCH_CLAIM_TIMEOUT_SEC", 2))
+# 使われたかどうかを追跡しておくページ数の上限
+PREFETCH_TRACK_MAX = 1024
+
+
+class Prefetcher:
+    """
+    検索結果の上位のページを、LLMが次のツールを選んでいる間に先読みしてページキャッシュに入れる
+
+    search_ddg の後はたいてい上位のページが fetch_page で読まれるため、
+    その通信とパースを先に済ませておくことで fetch_page の待ち時間を減らす
+
+    - `prefetch()` は検索結果のURLを受け取り、バックグラウンドで取得を始める
+    - `claim()` は fetch_page から呼ばれ、まだ始まっていない先読みは取り消し、
+      実行中の先読みは claim_timeout_sec 秒まで完了を待つ
+    - `metrics()` で先読みのヒット率と無駄になったバイト数を確認できる
+      (途中までしか読めずに使えなかったページと、読まれないままページキャッシュから消えたページ)
+    """
+    def __init__(self, top_k=PREFETCH_TOP_K, max_workers=PREFETCH_MAX_WORKERS,
+                 max_bytes=PREFETCH_MAX_BYTES, claim_timeout_sec=PREFETCH_CLAIM_TIMEOUT_SEC):
+        self.top_k = top_k
+        self.max_bytes = max_bytes
+        self.claim_timeout_sec = claim_timeout_sec
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="prefetch")
+        self._inflight = {}  # url -> Future
+        self._unused = OrderedDict()  # 先読みしたがまだ読まれていないページ: url -> バイト数
+        self._lock = threading.Lock()
+        self._stats = {"prefetched": 0, "hits": 0, "cancelled": 0, "timeouts": 0,
+                       "prefetched_bytes": 0, "wasted_bytes": 0}
+
+    def prefetch(self, urls, loader):
+        """
+        上位 top_k 件のURLの取得を始める
+        (loader は url, max_bytes, priority を受け取ってページを返す関数)
+        """
+        for url in urls[:self.top_k]:
+            with self._lock:
+                if url in self._inflight or url in page_cache:
+                    continue
+                self._inflight[url] = self._executor.submit(self._load, url, loader)
+
+    def claim(self, url):
+        """
+        fetch_page でページを読む前に呼ぶ
+
+        - 先読みがまだ始まっていなければ取り消す (呼び出し元が通常の優先度ですぐに取得する)
+        - 実行中であれば claim_timeout_sec 秒まで完了を待つ
+          (低い優先度の順番待ちにユーザーが待たされないように、待ちきれなければ呼び出し元が取得する)
+        """
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is not None and future.cancel():
+                self._inflight.pop(url, None)
+                self._stats["cancelled"] += 1
+                return
+        if future is not None:
+            try:
+                future.result(timeout=self.claim_timeout_sec)
+            except TimeoutError:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                return
+        with self._lock:
+            if url in self._unused:
+                self._unused.pop(url)
+                self._stats["hits"] += 1
+
+    def metrics(self):
+        with self._lock:
+            self._collect_wasted()
+            prefetched = self._stats["prefetched"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / prefetched if prefetched else 0.0,
+                # ページキャッシュに残っていて、まだ読まれていない分 (読まれなければ無駄になる)
+                "pending_bytes": sum(self._unused.values()),
+                "inflight": len(self._inflight),
+            }
+
+    def _load(self, url, loader):
+        try:
+            # ユーザーが待っているリクエストの邪魔をしないように、低い優先度で取得する
+            page = loader(url, max_bytes=self.max_bytes, priority=PRIORITY_BACKGROUND)
+        except Exception:
+            page = None
+        with self._lock:
+            self._inflight.pop(url, None)
+            if page is None or page["status"] != 200:
+                return
+            self._stats["prefetched"] += 1
+            self._stats["prefetched_bytes"] += page["bytes"]
+            if not page["complete"]:
+                # 途中までしか読めなかったページはキャッシュされないので、fetch_page で取得し直す
+                self._stats["wasted_bytes"] += page["bytes"]
+                return
+            self._unused[url] = page["bytes"]
+            self._collect_wasted()
+            while len(self._unused) > PREFETCH_TRACK_MAX:
+                _, size = self._unused.popitem(last=False)
+                self._stats["wasted_bytes"] += size
+
+    def _collect_wasted(self):
+        """ 読まれないままページキャッシュから消えた (期限切れ・LRUで削除された) ページを無駄として数える """
+        for url in [url for url in self._unused if url not in page_cache]:
+            self._stats["wasted_bytes"] += self._unused.pop(url)
+
+
+# 全セッションで共有する
+prefetcher = Prefetcher()
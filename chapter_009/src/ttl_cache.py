@@ -0,0 +1,42 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/src/ttl_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    有効期限 (ttl_sec) と件数の上限 (max_entries) を持つスレッドセーフなキャッシュ
+
+    件数が上限を超えたら、最も古く使われたものから削除する (LRU)
+    """
+    def __init__(self, ttl_sec=600, max_entries=1024):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (保存時刻, 値)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_sec:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic(), value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,11 +1,14 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/tools/fetch_page.py
 
 import requests
-import html2text
-from readability import Document
 from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import (BaseModel, Field)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.http_client import download_html, UnsupportedContentType, MAX_DOWNLOAD_BYTES
+from src.extractors import extract
+from src.page_cache import page_cache
+from src.prefetch import prefetcher
+from src.scheduler import PRIORITY_INTERACTIVE
+from src.text_splitter import split_text
 
 
 class FetchPageInput(BaseModel):
@@ -14,7 +17,7 @@ class FetchPageInput(BaseModel):
 
 
 @tool(args_schema=FetchPageInput)
-def fetch_page(url, page_num=0, timeout_sec=10):
+def fetch_page(url, page_num=0, timeout_sec=None):
     """
     指定されたURLから（とページ番号から）ウェブページのコンテンツを取得するツール。
 
@@ -37,38 +40,11 @@ def fetch_page(url, page_num=0, timeout_sec=10):
       - content: str
       - has_next: bool
     """
-    try:
-        response = requests.get(url, timeout=timeout_sec)
-        response.encoding = 'utf-8'
-    except requests.exceptions.Timeout:
-        return {
-            "status": 500,
-            "page_content": {'error_message': 'Could not download page due to Timeout Error. Please try to fetch other pages.'}
-        }
+    page = load_page(url, timeout_sec)
+    if page["status"] != 200:
+        return page
 
-    if response.status_code != 200:
-        return {
-            "status": response.status_code,
-            "page_content": {'error_message': 'Could not download page. Please try to fetch other pages.'}
-        }
-    
-    try:
-        doc = Document(response.text)
-        title = doc.title()
-        html_content = doc.summary()
-        content = html2text.html2text(html_content)
-    except:
-        return {
-            "status": 500,
-            "page_content": {'error_message': 'Could not parse page. Please try to fetch other pages.'}
-        }
-
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name='gpt-3.5-turbo',
-        chunk_size=1000,
-        chunk_overlap=0,
-    )
-    chunks = text_splitter.split_text(content)
+    chunks = page["chunks"]
     if page_num >= len(chunks):
         return {
             "status": 500,
@@ -83,8 +59,86 @@ def fetch_page(url, page_num=0, timeout_sec=10):
         return {
             "status": 200,
             "page_content": {
-                "title": title,
+                "title": page["title"],
                 "content": chunks[page_num],
                 "has_next": page_num < len(chunks) - 1
             }
         }
+
+
+def load_page(url, timeout_sec=None):
+    """
+    ページをダウンロード・パースしてチャンクに分割する
+
+    結果はURLごとにキャッシュされるので、同じページの page_num を変えて読む場合は
+    ダウンロードやパースをやり直さない (エラーの場合はキャッシュしない)
+
+    Returns
+    -------
+    Dict[str, Any]:
+    - status: int
+    - title: str
+    - chunks: List[str]
+    - bytes: int (ダウンロードしたHTMLのサイズ)
+    - complete: bool (通常のサイズの上限まで読めたかどうか)
+    (エラーの場合は fetch_page と同じ `status` と `page_content` を返す)
+    """
+    # 検索結果の先読み中のページであれば、その完了を待ってキャッシュから返す
+    prefetcher.claim(url)
+    if page := page_cache.get(url):
+        return page
+    return fetch_and_cache_page(url, timeout_sec)
+
+
+def fetch_and_cache_page(url, timeout_sec=None, max_bytes=MAX_DOWNLOAD_BYTES,
+                         priority=PRIORITY_INTERACTIVE):
+    """
+    キャッシュを見ずにページを取得・パース・分割し、成功した場合はキャッシュに入れる
+    (通常より小さい max_bytes で途中までしか読めなかったページは、fetch_page で読むものと
+    内容が違う (has_next も正しくない) のでキャッシュしない)
+    """
+    try:
+        # 共有のコネクションプールを使い、サイズの上限までストリーミングでダウンロードする
+        status_code, html, complete = download_html(url, timeout_sec, max_bytes=max_bytes, priority=priority)
+    except requests.exceptions.Timeout:
+        return {
+            "status": 500,
+            "page_content": {'error_message': 'Could not download page due to Timeout Error. Please try to fetch other pages.'}
+        }
+    except UnsupportedContentType as e:
+        return {
+            "status": 415,
+            "page_content": {'error_message': f'This URL is not a HTML page (Content-Type: {e.content_type}). Please try to fetch other pages.'}
+        }
+    except requests.exceptions.RequestException:
+        return {
+            "status": 500,
+            "page_content": {'error_message': 'Could not download page. Please try to fetch other pages.'}
+        }
+
+    if status_code != 200:
+        return {
+            "status": status_code,
+            "page_content": {'error_message': 'Could not download page. Please try to fetch other pages.'}
+        }
+
+    try:
+        # 本文の抽出エンジンは環境変数 HTML_EXTRACTOR で切り替えられる
+        title, content = extract(html)
+    except:
+        return {
+            "status": 500,
+            "page_content": {'error_message': 'Could not parse page. Please try to fetch other pages.'}
+        }
+
+    page = {
+        "status": 200,
+        "title": title,
+        # エンコーダーを使い回し、1回のトークン化で 1,000 トークンずつに分割する
+        "chunks": split_text(content, chunk_size=1000, model_name='gpt-3.5-turbo'),
+        "bytes": len(html.encode('utf-8')),
+        "complete": complete or max_bytes >= MAX_DOWNLOAD_BYTES,
+    }
+    if page["complete"]:
+        page_cache.set(url, page)
+    return page
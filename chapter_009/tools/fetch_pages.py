@@ -0,0 +1,94 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/tools/fetch_pages.py
+
+import time
+from typing import List
+from concurrent.futures import ThreadPoolExecutor, wait
+from langchain_core.tools import tool
+from langchain_core.pydantic_v1 import (BaseModel, Field)
+from tools.fetch_page import load_page
+
+# 一度に取得できるURLの数の上限
+MAX_URLS = 5
+
+# 全セッションで共有するスレッドプール
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="fetch-pages")
+
+
+class FetchPagesInput(BaseModel):
+    urls: List[str] = Field(description=f"読みたいページのURLのリスト (最大{MAX_URLS}件)")
+
+
+@tool(args_schema=FetchPagesInput)
+def fetch_pages(urls, timeout_sec=15):
+    """
+    複数のURLのウェブページを同時に取得するツール。
+    検索結果の複数のページを読みたい場合は、`fetch_page` を何度も呼ぶ代わりにこのツールを使ってください。
+
+    各ページの最初の部分（最大1,000トークン）のみを返します。
+    ページにさらにコンテンツがある場合、`has_next`の値はTrueになります。
+    続きを読みたい場合は、`fetch_page` ツールで同じURLと`page_num=1`を指定してください。
+
+    statusが200でないページは取得時にエラーが発生しています。（他のページの取得を試みてください）
+
+    Returns
+    -------
+    List[Dict[str, Any]]:
+    - url: str
+    - status: str
+    - page_content
+      - title: str
+      - content: str
+      - has_next: bool
+    """
+    urls = list(dict.fromkeys(urls))[:MAX_URLS]  # 重複を除いて上限までにする
+    started_at = {}
+
+    def task(url):
+        started_at[url] = time.monotonic()
+        return load_page(url, timeout_sec)
+
+    submitted_at = time.monotonic()
+    futures = [_executor.submit(task, url) for url in urls]
+
+    def deadline(url):
+        # タイムアウトはURLごとに、そのページの取得が始まった時点から数える
+        # (共有のスレッドプールの空き待ちは含めないが、空き待ちも timeout_sec 秒までとする)
+        return started_at.get(url, submitted_at) + timeout_sec
+
+    results = []
+    for url, future in zip(urls, futures):
+        while not future.done() and (remaining := deadline(url) - time.monotonic()) > 0:
+            wait([future], timeout=remaining)
+        if not future.done():
+            future.cancel()
+            page = {
+                "status": 500,
+                "page_content": {'error_message': 'Could not download page due to Timeout Error. Please try to fetch other pages.'}
+            }
+        elif future.exception() is not None:
+            page = {
+                "status": 500,
+                "page_content": {'error_message': 'Could not download page. Please try to fetch other pages.'}
+            }
+        else:
+            page = future.result()
+
+        if page["status"] == 200 and not page["chunks"]:
+            page = {
+                "status": 500,
+                "page_content": {'error_message': 'Page has no content. Please try to fetch other pages.'}
+            }
+        if page["status"] != 200:
+            results.append({"url": url, **page})
+            continue
+
+        results.append({
+            "url": url,
+            "status": 200,
+            "page_content": {
+                "title": page["title"],
+                "content": page["chunks"][0],
+                "has_next": len(page["chunks"]) > 1
+            }
+        })
+    return results
@@ -1,9 +1,16 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_009/tools/search_ddg.py
 
-from itertools import islice
+import os
+import threading
+import unicodedata
+from urllib.parse import urlsplit, urlunsplit
 from duckduckgo_search import DDGS
 from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import (BaseModel, Field)
+from src.ttl_cache import TTLCache
+from src.prefetch import prefetcher
+from src.scheduler import scheduler
+from tools.fetch_page import fetch_and_cache_page
 
 
 """
@@ -18,12 +25,39 @@ Sample Response of DuckDuckGo python library
 ]
 """
 
+# 検索結果のキャッシュ (同じ検索は他のユーザーの分も含めて使い回す)
+search_cache = TTLCache(
+    ttl_sec=float(os.environ.get("SEARCH_CACHE_TTL_SEC", 3600)),
+    max_entries=int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 1024)),
+)
+_local = threading.local()
+
+
+def get_ddgs():
+    """ DDGS クライアントはスレッドごとに1つ作って使い回す """
+    if getattr(_local, "ddgs", None) is None:
+        _local.ddgs = DDGS()
+    return _local.ddgs
+
+
+def normalize_query(query):
+    """ 全角・半角や大文字・小文字、空白の違いを吸収する """
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def normalize_url(url):
+    """ 重複判定用にURLを正規化する (フラグメントと末尾のスラッシュを無視する) """
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path.rstrip("/"), parts.query, ""))
+
+
 class SearchDDGInput(BaseModel):
     query: str = Field(description="検索したいキーワードを入力してください")
 
 
 @tool(args_schema=SearchDDGInput)
-def search_ddg(query, max_result_num=5):
+def search_ddg(query, max_result_num=5, region='wt-wt', backend="lite"):
     """
     DuckDuckGo検索を実行するためのツールです。
     検索したいキーワードを入力して使用してください。
@@ -41,12 +75,35 @@ def search_ddg(query, max_result_num=5):
     - snippet
     - url
     """
-    res = DDGS().text(query, region='wt-wt', safesearch='off', backend="lite")
-    return [
-        {
-            "title": r.get('title', ""),
-            "snippet": r.get('body', ""),
-            "url": r.get('href', "")
-        }
-        for r in islice(res, max_result_num)
-    ]
+    cache_key = (normalize_query(query), region, backend, max_result_num)
+    if (results := search_cache.get(cache_key)) is None:
+        results = _search(query, max_result_num, region, backend)
+        search_cache.set(cache_key, results)
+
+    # (PREFETCH_TOP_K を設定した場合) LLMが次の行動を決めている間に上位のページを先読みしておく
+    prefetcher.prefetch([r["url"] for r in results], loader=fetch_and_cache_page)
+    return results
+
+
+def _search(query, max_result_num, region, backend):
+    # DuckDuckGo は短時間に何度も検索すると制限されるので、スケジューラで順番待ちする
+    # (結果はジェネレータで、読み進めるごとにリクエストが発生するので全体を囲む)
+    with scheduler.slot("https://duckduckgo.com/"):
+        res = get_ddgs().text(query, region=region, safesearch='off', backend=backend)
+
+        # 検索結果の複数ページにまたがって同じURLが出てくることがあるので除く
+        results = []
+        seen_urls = set()
+        for r in res:
+            url = r.get('href', "")
+            if normalize_url(url) in seen_urls:
+                continue
+            seen_urls.add(normalize_url(url))
+            results.append({
+                "title": r.get('title', ""),
+                "snippet": r.get('body', ""),
+                "url": url
+            })
+            if len(results) >= max_result_num:
+                break
+    return results
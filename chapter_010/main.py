@@ -7,7 +7,6 @@ from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain.agents import AgentExecutor
 from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
-from langchain.memory import ConversationBufferWindowMemory
 
 # models
 from langchain_openai import ChatOpenAI
@@ -18,6 +17,10 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from tools.fetch_qa_content import fetch_qa_content
 from tools.fetch_stores_by_prefecture import fetch_stores_by_prefecture
 
+# memory / router
+from src.memory import TokenBudgetMemory
+from src.router import ModelRouter
+
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -74,10 +77,10 @@ def init_messages():
         st.session_state.messages = [
             {"role": "assistant", "content": welcome_message}
         ]
-        st.session_state['memory'] = ConversationBufferWindowMemory(
+        st.session_state['memory'] = TokenBudgetMemory(
             return_messages=True,
             memory_key="chat_history",
-            k=10
+            max_token_limit=2000
         )
 
 
@@ -108,6 +111,20 @@ def create_agent():
         MessagesPlaceholder(variable_name="agent_scratchpad")
     ])
     llm = select_model()
+    # 古い会話の要約にも選択中のモデルを使う (OpenAI 以外のモデルでは OpenAI の API キーを不要にする)
+    st.session_state['memory'].llm = llm
+
+    # ルーターモード: まず速いモデルで回答し、自信がない場合のみ選択したモデルで回答し直す
+    if st.sidebar.checkbox("Auto routing (GPT-3.5 → selected model)"):
+        return ModelRouter(
+            fast_llm=ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo"),
+            strong_llm=llm,
+            tools=tools,
+            prompt=prompt,
+            memory=st.session_state['memory'],
+            self_check=True
+        )
+
     agent = create_tool_calling_agent(llm, tools, prompt)
     return AgentExecutor(
         agent=agent,
@@ -136,6 +153,11 @@ def main():
                 config=RunnableConfig({'callbacks': [st_cb]})
             )
             st.write(response["output"])
+            if route := response.get("route"):
+                st.caption(
+                    f"model: {route['tiers'][-1]['model']} / "
+                    f"latency: {route['total_latency_sec']}s / "
+                    f"cost: ${route['total_cost_usd']}")
 
 
 if __name__ == '__main__':
@@ -2,7 +2,6 @@
 
 import streamlit as st
 from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain.memory import ConversationBufferWindowMemory
 from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_community.callbacks import StreamlitCallbackHandler
@@ -16,6 +15,7 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from tools.fetch_qa_content import fetch_qa_content
 from tools.fetch_stores_by_prefecture import fetch_stores_by_prefecture
 from src.cache import Cache
+from src.memory import TokenBudgetMemory
 
 ###### dotenv を利用しない場合は消してください ######
 try:
@@ -49,10 +49,10 @@ def init_messages():
         st.session_state.messages = [
             {"role": "assistant", "content": welcome_message}
         ]
-        st.session_state['memory'] = ConversationBufferWindowMemory(
+        st.session_state['memory'] = TokenBudgetMemory(
             return_messages=True,
             memory_key="chat_history",
-            k=10
+            max_token_limit=2000
         )
 
     if len(st.session_state.messages) == 1:  # welcome messageのみの場合
@@ -90,6 +90,8 @@ def create_agent():
         MessagesPlaceholder(variable_name="agent_scratchpad")
     ])
     llm = select_model()
+    # 古い会話の要約にも選択中のモデルを使う (OpenAI 以外のモデルでは OpenAI の API キーを不要にする)
+    st.session_state['memory'].llm = llm
     agent = create_tool_calling_agent(llm, tools, prompt)
     return AgentExecutor(
         agent=agent,
@@ -3,7 +3,6 @@
 import streamlit as st
 from langchain import callbacks
 from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain.memory import ConversationBufferWindowMemory
 from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_community.callbacks import StreamlitCallbackHandler
@@ -21,6 +20,9 @@ from tools.fetch_stores_by_prefecture import fetch_stores_by_prefecture
 from src.cache import Cache
 from src.feedback import add_feedback
 
+# memory
+from src.memory import TokenBudgetMemory
+
 ###### dotenv を利用しない場合は消してください ######
 try:
     from dotenv import load_dotenv
@@ -53,10 +55,10 @@ def init_messages():
         st.session_state.messages = [
             {"role": "assistant", "content": welcome_message}
         ]
-        st.session_state['memory'] = ConversationBufferWindowMemory(
+        st.session_state['memory'] = TokenBudgetMemory(
             return_messages=True,
             memory_key="chat_history",
-            k=10
+            max_token_limit=2000
         )
 
     if len(st.session_state.messages) == 1:  # welcome messageのみの場合
@@ -92,6 +94,8 @@ def create_agent():
         MessagesPlaceholder(variable_name="agent_scratchpad")
     ])
     llm = select_model()
+    # 古い会話の要約にも選択中のモデルを使う (OpenAI 以外のモデルでは OpenAI の API キーを不要にする)
+    st.session_state['memory'].llm = llm
     agent = create_tool_calling_agent(llm, tools, prompt)
     return AgentExecutor(
         agent=agent,
@@ -0,0 +1,279 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_010/server.py
+"""
+カスタマーサポートエージェントを Streamlit を使わずに HTTP API として提供するサーバー
+
+main.py と同じエージェント・ツール・キャッシュを利用し、
+回答はトークン単位で NDJSON (1行1イベントのJSON) としてストリーミングで返す。
+
+起動方法 (chapter_010 ディレクトリで実行してください):
+    python server.py
+    # もしくは
+    uvicorn server:app --host 0.0.0.0 --port 8000 --workers 1
+
+リクエスト例:
+    curl -N -X POST localhost:8000/chat \
+        -H 'Content-Type: application/json' \
+        -d '{"session_id": "abc", "input": "法人で契約することはできるの？"}'
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from langchain.agents import create_tool_calling_agent, AgentExecutor
+from langchain_community.vectorstores import FAISS
+from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
+
+# models
+from langchain_openai import ChatOpenAI
+from langchain_anthropic import ChatAnthropic
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+# custom tools
+from tools.fetch_qa_content import load_qa_vectorstore, create_fetch_qa_content_tool
+from tools.fetch_stores_by_prefecture import fetch_stores_by_prefecture
+
+# cache / memory
+from src.cache import Cache, SCORE_THRESHOLD
+from src.memory import TokenBudgetMemory
+
+###### dotenv を利用しない場合は消してください ######
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    import warnings
+    warnings.warn("dotenv not found. Please make sure to set your environment variables manually.", ImportWarning)
+################################################
+
+# 同時に実行するエージェントの数の上限 (LLM API のレート制限に合わせて調整してください)
+MAX_CONCURRENCY = int(os.environ.get("AGENT_MAX_CONCURRENCY", 8))
+# メモリに保持するセッション数の上限 (古いものから破棄する)
+MAX_SESSIONS = int(os.environ.get("AGENT_MAX_SESSIONS", 1000))
+
+MODELS = {
+    "GPT-3.5": lambda: ChatOpenAI(
+        temperature=0, model_name="gpt-3.5-turbo", streaming=True),
+    "GPT-4": lambda: ChatOpenAI(
+        temperature=0, model_name="gpt-4o", streaming=True),
+    "Claude 3.5 Sonnet": lambda: ChatAnthropic(
+        temperature=0, model_name="claude-3-5-sonnet-20240620", streaming=True),
+    "Gemini 1.5 Pro": lambda: ChatGoogleGenerativeAI(
+        temperature=0, model="gemini-1.5-pro-latest"),
+}
+DEFAULT_MODEL = "GPT-4"
+
+
+class ResourcePool:
+    """
+    プロセス全体で共有するリソース (ベクトルDB・キャッシュ・LLMクライアント・プロンプト)
+
+    リクエストごとに作り直すと HTTP コネクションやベクトルDBの読み込みが
+    毎回発生するため、最初に一度だけ作成して全セッションで使い回す
+
+    回答のキャッシュのベクトルDBもメモリ上に1つだけ保持し、検索も追加・保存も同じロックの中で行う
+    (質問の埋め込みの計算は API 呼び出しで時間がかかるので、ロックの外で行う)
+    """
+    def __init__(self, system_prompt_path="./prompt/system_prompt.txt"):
+        with open(system_prompt_path, "r", encoding="utf-8") as f:
+            self.system_prompt = f.read()
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", self.system_prompt),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("user", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad")
+        ])
+        # 「よくある質問」のベクトルDBは起動時に読み込んでおく
+        self.qa_vectorstore = load_qa_vectorstore()
+        self.tools = [create_fetch_qa_content_tool(self.qa_vectorstore), fetch_stores_by_prefecture]
+        self.cache = Cache()
+        self.cache_vectorstore = self.cache.load_vectorstore()
+        self._llms = {}
+        self._lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+
+    def get_llm(self, model):
+        with self._lock:
+            if model not in self._llms:
+                self._llms[model] = MODELS[model]()
+            return self._llms[model]
+
+    def search_cache(self, query):
+        """ 質問に類似する過去の質問を検索し、その回答を返す (src/cache.py の Cache.search と同じ) """
+        if self.cache_vectorstore is None:
+            return None
+        embedding = self.cache.embeddings.embed_query(query)
+        with self._cache_lock:
+            docs = self.cache_vectorstore.similarity_search_with_score_by_vector(
+                embedding, k=1, score_threshold=SCORE_THRESHOLD)
+        if docs:
+            return docs[0][0].metadata["answer"]
+        return None
+
+    def save_cache(self, query, answer):
+        """ (初回質問に対する) 回答をキャッシュに追加し、ファイルに保存する """
+        text_embeddings = [(query, self.cache.embeddings.embed_query(query))]
+        metadatas = [{"answer": answer}]
+        with self._cache_lock:
+            if self.cache_vectorstore is None:
+                self.cache_vectorstore = FAISS.from_embeddings(
+                    text_embeddings, self.cache.embeddings, metadatas=metadatas)
+            else:
+                self.cache_vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+            self.cache_vectorstore.save_local(self.cache.vectorstore_path)
+
+    def create_agent(self, model, memory):
+        llm = self.get_llm(model)
+        # 古い会話の要約にも、このリクエストで使うモデルを使う
+        memory.llm = llm
+        agent = create_tool_calling_agent(llm, self.tools, self.prompt)
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=False,
+            memory=memory
+        )
+
+
+class Session:
+    def __init__(self, memory):
+        self.memory = memory
+        # 同じセッションの会話は順番に処理する (会話履歴の順序を保つため)
+        self.lock = asyncio.Lock()
+
+
+class SessionStore:
+    """ セッションごとの会話履歴を保持する (上限を超えたら古いものから破棄する) """
+    def __init__(self, resources, max_sessions=MAX_SESSIONS):
+        self.resources = resources
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def get(self, session_id):
+        if session_id in self._sessions:
+            self._sessions.move_to_end(session_id)
+        else:
+            self._sessions[session_id] = Session(TokenBudgetMemory(
+                return_messages=True,
+                memory_key="chat_history",
+                max_token_limit=2000
+            ))
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return self._sessions[session_id]
+
+    def delete(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class ChatRequest(BaseModel):
+    input: str
+    session_id: Optional[str] = None
+    model: str = DEFAULT_MODEL
+
+
+resources: Optional[ResourcePool] = None
+sessions: Optional[SessionStore] = None
+semaphore: Optional[asyncio.Semaphore] = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """ 起動時に共有リソースを作成する """
+    global resources, sessions, semaphore
+    resources = ResourcePool()
+    sessions = SessionStore(resources)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    yield
+
+
+app = FastAPI(title="Customer Support Agent", lifespan=lifespan)
+
+
+def to_line(event_type, **kwargs):
+    return json.dumps({"type": event_type, **kwargs}, ensure_ascii=False) + "\n"
+
+
+async def stream_agent(session_id, session, request):
+    """ エージェントを実行し、イベントを NDJSON の行として順に返す """
+    async with session.lock, semaphore:
+        yield to_line("session", session_id=session_id)
+
+        # 最初の質問の場合はキャッシュをチェックする (main_cache.py と同じ)
+        first_question = not session.memory.chat_memory.messages
+        if first_question:
+            cache_content = await asyncio.to_thread(
+                resources.search_cache, request.input)
+            if cache_content:
+                session.memory.save_context(
+                    {"input": request.input}, {"output": cache_content})
+                yield to_line("final", output=cache_content, cached=True)
+                return
+
+        agent = resources.create_agent(request.model, session.memory)
+        output = None
+        try:
+            async for event in agent.astream_events(
+                    {"input": request.input}, version="v1"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content and isinstance(content, str):
+                        yield to_line("token", content=content)
+                elif kind == "on_tool_start":
+                    yield to_line("tool_start", name=event["name"],
+                                  input=event["data"].get("input"))
+                elif kind == "on_tool_end":
+                    yield to_line("tool_end", name=event["name"],
+                                  output=str(event["data"].get("output")))
+                elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
+                    output = event["data"]["output"]["output"]
+        except Exception:
+            yield to_line("error", message=traceback.format_exc())
+            return
+
+        yield to_line("final", output=output, cached=False)
+
+        # 最初の質問の場合はキャッシュに保存する
+        if first_question and output:
+            await asyncio.to_thread(resources.save_cache, request.input, output)
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    if request.model not in MODELS:
+        return StreamingResponse(
+            iter([to_line("error", message=f"unknown model: {request.model}")]),
+            media_type="application/x-ndjson", status_code=400)
+    session_id = request.session_id or uuid.uuid4().hex
+    session = sessions.get(session_id)
+    return StreamingResponse(
+        stream_agent(session_id, session, request),
+        media_type="application/x-ndjson")
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    return {"deleted": sessions.delete(session_id)}
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok", "sessions": len(sessions)}
+
+
+if __name__ == '__main__':
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -5,6 +5,9 @@ import streamlit as st
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 
+# 類似度の閾値は調整が必要 / L2距離なので小さい方が類似度が高い
+SCORE_THRESHOLD = 0.05
+
 
 class Cache:
     def __init__(
@@ -49,8 +52,7 @@ class Cache:
         docs = self.vectorstore.similarity_search_with_score(
             query=query,
             k=1,
-            # 類似度の閾値は調整が必要 / L2距離なので小さい方が類似度が高い
-            score_threshold=0.05
+            score_threshold=SCORE_THRESHOLD
         )
         if docs:
             return docs[0][0].metadata["answer"]
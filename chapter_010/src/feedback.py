@@ -1,12 +1,250 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_010/src/feedback.py
 
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+import traceback
+
 import streamlit as st
 from langsmith import Client
+from langsmith.utils import LangSmithConflictError, LangSmithNotFoundError
 from streamlit_feedback import streamlit_feedback
 
+logger = logging.getLogger(__name__)
+
+# リトライしない (リトライしても成功しない) HTTP ステータスコード
+# 4xx はリクエスト自体の誤りなので、タイムアウト (408) とレート制限 (429) 以外はリトライしない
+# 501 (DELETE などに対応していないサーバー) も同じ
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+NOT_IMPLEMENTED = 501
+
+
+def _status_code(error):
+    """ LangSmith の例外の元になった HTTP エラーのステータスコード (無ければ None) """
+    # LangSmith は requests の HTTPError を何段か包み直して送出するので、元の例外までたどる
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        if response is not None and getattr(response, "status_code", None) is not None:
+            return response.status_code
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_permanent_error(error):
+    """ リトライしても成功しないエラーか (4xx・501) """
+    status_code = _status_code(error)
+    if status_code is None:
+        return False  # 接続エラーなど
+    return (400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS
+            or status_code == NOT_IMPLEMENTED)
+
+
+class FeedbackQueue:
+    """
+    LangSmith へのフィードバック送信をバックグラウンドで行うキュー
+
+    - 画面の処理では `submit()` でキューに積むだけなので、LangSmith が遅くても画面が止まらない
+    - バックグラウンドのワーカーが溜まった分 (最大 drain_size 件) を取り出して1件ずつ送信し、失敗したらリトライする
+      (LangSmith にはフィードバックをまとめて作成する API が無いので、送信は1件ずつになる)
+    - ユーザーがフィードバックを変更した場合は、前のフィードバックを削除して新しいものを作成する
+      (まだ送信していなければ、前のフィードバックは送らずに済ませる)
+    - リトライしても送れなかったものはローカルのファイル (spool) に書き出し、
+      LangSmith が復旧したら (順番を保ったまま) 再送する
+      (spool に保存するのは最大 max_spool_items 件まで。超えた分は古いものから捨てる)
+    - リトライしても成功しないエラー (4xx など) になったものは、ログに残して捨てる
+      (1件の不正なフィードバックのために、後ろのフィードバックが送れなくならないようにする)
+    - `metrics()` でキューに溜まっている件数などを確認できる
+
+    テストなどでは `client=Client(api_url=<ローカルのスタブサーバー>, api_key="dummy")` を渡すと
+    実際の LangSmith の代わりにローカルのサーバーへ送信できる
+    """
+    def __init__(
+        self,
+        client=None,
+        spool_path="./feedback_spool.jsonl",
+        drain_size=20,
+        flush_interval_sec=1.0,
+        max_retries=3,
+        retry_backoff_sec=0.5,
+        max_spool_items=10000,
+    ):
+        self.client = client or Client()
+        self.spool_path = spool_path
+        self.drain_size = drain_size
+        self.flush_interval_sec = flush_interval_sec
+        self.max_retries = max_retries
+        self.retry_backoff_sec = retry_backoff_sec
+        self.max_spool_items = max_spool_items
+
+        self._queue = queue.Queue()
+        self._spool_lock = threading.Lock()
+        self._stats = {"sent": 0, "retried": 0, "spooled": 0, "resent_from_spool": 0, "coalesced": 0,
+                       "dropped": 0}
+        self._worker = threading.Thread(
+            target=self._run, name="feedback-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, run_id, key, score=None, comment=None, replaces=None):
+        """
+        フィードバックをキューに積んで、すぐに feedback_id を返す
+        replaces に前のフィードバックの feedback_id を指定すると、それを削除して置き換える
+        """
+        if replaces is not None:
+            self._queue.put({"action": "delete", "feedback_id": str(replaces)})
+        feedback_id = str(uuid.uuid4())
+        self._queue.put({
+            "action": "create",
+            "run_id": str(run_id),
+            "key": key,
+            "score": score,
+            "comment": comment,
+            "feedback_id": feedback_id,
+        })
+        return feedback_id
+
+    def metrics(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "spool_depth": len(self._read_spool()),
+            **self._stats,
+        }
+
+    def flush(self, timeout=None):
+        """ キューに積まれたフィードバックの送信完了を待つ (主にテスト・終了処理用) """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        while True:
+            items = self._drain()
+            try:
+                self._send_pending(items)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _drain(self):
+        """ 最大 drain_size 件を取り出す (1件も無ければ flush_interval_sec 待って空のリストを返す) """
+        try:
+            items = [self._queue.get(timeout=self.flush_interval_sec)]
+        except queue.Empty:
+            return []
+        while len(items) < self.drain_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _send_pending(self, items):
+        """
+        送れずに溜まっていたもの (spool) に続けて、取り出したものを順番に送る
+        送れなかった場合は、それ以降のものも順番を保ったまま spool に書き出す
+        (LangSmith が止まっている間は、残りを送ろうとしても失敗するだけなので)
+        """
+        spooled = self._read_spool()
+        pending = self._coalesce(spooled + items)
+        for i, item in enumerate(pending):
+            if not self._send_with_retries(item):
+                self._write_spool(pending[i:])
+                self._stats["spooled"] += sum(not x.get("spooled") for x in pending[i:])
+                return
+            if item.get("spooled"):
+                self._stats["resent_from_spool"] += 1
+        if spooled:
+            self._write_spool([])
+
+    def _coalesce(self, items):
+        """ まだ送っていないフィードバックを削除する場合は、作成も削除も送らない """
+        pending = {}
+        for item in items:
+            if item["action"] == "delete" and ("create", item["feedback_id"]) in pending:
+                del pending[("create", item["feedback_id"])]
+                self._stats["coalesced"] += 2
+                continue
+            pending[(item["action"], item["feedback_id"])] = item
+        return list(pending.values())
+
+    def _send(self, item):
+        if item["action"] == "delete":
+            try:
+                self.client.delete_feedback(item["feedback_id"])
+            except LangSmithNotFoundError:
+                pass  # 既に削除されている
+            return
+        try:
+            self.client.create_feedback(
+                item["run_id"],
+                item["key"],
+                score=item["score"],
+                comment=item["comment"],
+                feedback_id=item["feedback_id"],
+            )
+        except LangSmithConflictError:
+            # 同じ feedback_id で作成済み (前回の送信は成功していたが、応答を受け取る前に失敗した場合など)
+            pass
+
+    def _send_with_retries(self, item):
+        """
+        送信できた場合と、リトライしても成功しないので捨てた場合は True、
+        一時的なエラーでリトライしても送れなかった場合は False を返す
+        """
+        for attempt in range(self.max_retries):
+            try:
+                self._send(item)
+                self._stats["sent"] += 1
+                return True
+            except Exception as e:
+                if is_permanent_error(e):
+                    logger.error("dropped feedback that cannot be sent: %s\n%s",
+                                 json.dumps(item, ensure_ascii=False), traceback.format_exc())
+                    self._stats["dropped"] += 1
+                    return True
+                logger.warning("failed to send feedback (attempt %d):\n%s",
+                               attempt + 1, traceback.format_exc())
+                if attempt < self.max_retries - 1:
+                    self._stats["retried"] += 1
+                    time.sleep(self.retry_backoff_sec * (2 ** attempt))
+        return False
+
+    def _read_spool(self):
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return []
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                # action の無い行は、変更に対応する前に書き出した作成のフィードバック
+                return [{"action": "create", **json.loads(line)} for line in f if line.strip()]
+
+    def _write_spool(self, items):
+        if len(items) > self.max_spool_items:
+            overflow = items[:len(items) - self.max_spool_items]
+            logger.error("feedback spool is full, dropped %d oldest items", len(overflow))
+            self._stats["dropped"] += len(overflow)
+            items = items[len(overflow):]
+        with self._spool_lock:
+            with open(self.spool_path, "w", encoding="utf-8") as f:
+                for item in items:
+                    f.write(json.dumps({**item, "spooled": True}, ensure_ascii=False) + "\n")
+
+
+@st.cache_resource
+def get_feedback_queue():
+    """ プロセス全体で1つの FeedbackQueue を共有する (LangSmith Client も使い回す) """
+    return FeedbackQueue()
+
 
 def add_feedback():
-    langsmith_client = Client()
+    feedback_queue = get_feedback_queue()
 
     run_id = st.session_state["run_id"]
 
@@ -19,7 +257,13 @@ def add_feedback():
 
     scores = {"👍": 1, "👎": 0}
 
-    if feedback:
+    # 再実行のたびに同じフィードバックを送信しないようにする
+    # (同じ回答へのフィードバックが変更された場合は、前のものを新しいもので置き換える)
+    previous = st.session_state.get("feedback", {})
+    if previous.get("run_id") != run_id:
+        previous = {}
+    if feedback and (previous.get("score"), previous.get("comment")) != (
+            scores.get(feedback["score"]), feedback.get("text")):
         # 選択されたフィードバックオプションに応じたスコアを取得
         score = scores.get(feedback["score"])
 
@@ -28,17 +272,20 @@ def add_feedback():
             feedback_type_str = f"thumbs {feedback['score']}"
 
             # 作成したフィードバックタイプの文字列と任意のコメントを用いて、
-            # フィードバックをレコードに記録
-            feedback_record = langsmith_client.create_feedback(
+            # フィードバックを送信キューに積む (送信はバックグラウンドで行われる)
+            feedback_id = feedback_queue.submit(
                 run_id,
                 feedback_type_str,
                 score=score,
                 comment=feedback.get("text"),
+                replaces=previous.get("feedback_id"),
             )
             # フィードバックIDとスコアをセッション状態に保存
             st.session_state.feedback = {
-                "feedback_id": str(feedback_record.id),
+                "feedback_id": feedback_id,
                 "score": score,
+                "comment": feedback.get("text"),
+                "run_id": run_id,
             }
         else:
             # 無効なフィードバックスコアの場合は警告を表示
@@ -0,0 +1,161 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_010/src/memory.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import tiktoken
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import AIMessage, HumanMessage, get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.pydantic_v1 import PrivateAttr
+
+# 要約はリクエストの外 (バックグラウンド) で実行する
+# 全セッションで共有するのでワーカー数は少なめにしておく
+_summary_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="memory-summary")
+
+# トークン数のカウントはモデルに関わらず tiktoken で概算する
+# (Claude / Gemini の get_num_tokens は API 呼び出しになる場合があるため)
+_encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+
+
+def count_tokens(messages):
+    return sum(len(_encoding.encode(m.content)) for m in messages
+               if isinstance(m.content, str))
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """
+    トークン数の上限内で会話履歴を保持するメモリ
+
+    - 直近の会話は `max_token_limit` トークンに収まる範囲でそのまま保持する
+    - 上限を超えた古い会話は、バックグラウンドで要約してキャッシュしておく
+    - プロンプトには「要約 + 直近の会話」だけを渡すので、長い回答が続いても
+      プロンプトのサイズが一定に収まる
+
+    `chat_memory` には全ての会話がそのまま残るため、
+    画面への会話履歴の表示は ConversationBufferWindowMemory と同じように行える
+
+    要約はシステムメッセージではなく、会話の先頭の1往復 (Human: 要約, AI: 了解) として渡す
+    (Claude は会話の途中にシステムメッセージがあるとエラーになり、会話は Human から始まる必要がある)
+
+    Example:
+    ===============
+    memory = TokenBudgetMemory(
+        return_messages=True,
+        memory_key="chat_history",
+        max_token_limit=2000
+    )
+    memory.llm = llm  # 要約に利用するモデル (会話に使っているモデルをそのまま使える)
+    """
+    # 要約に利用するモデル (None の間は要約しない)
+    llm: Optional[BaseLanguageModel] = None
+    memory_key: str = "history"
+    max_token_limit: int = 2000
+    summary_prefix: str = "これまでの会話の要約:"
+    summary_ack: str = "承知しました。この要約を踏まえて会話を続けます。"
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+
+    # 要約済みの会話の内容と件数 (chat_memory.messages の先頭から何件か)
+    summary: str = ""
+    summarized_count: int = 0
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _future: Any = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        要約 + まだ要約されていない直近の会話を返す
+
+        要約が追いついていない (要約中・要約に使うモデルが無いなど) 場合でもプロンプトが上限に収まるように、
+        直近の会話が max_token_limit を超えている分は古い往復から渡さない (直近の1往復は必ず残す)
+        (渡さなかった会話も chat_memory には残っているので、要約が終われば要約に含まれる)
+        """
+        with self._lock:
+            summary = self.summary
+            buffer = self.chat_memory.messages[self.summarized_count:]
+
+        remaining = count_tokens(buffer)
+        start = 0
+        while remaining > self.max_token_limit and start < len(buffer) - 2:
+            remaining -= count_tokens(buffer[start:start + 2])
+            start += 2
+        buffer = buffer[start:]
+
+        if summary:
+            buffer = [
+                HumanMessage(content=f"{self.summary_prefix}\n{summary}"),
+                AIMessage(content=self.summary_ack),
+            ] + buffer
+
+        if self.return_messages:
+            return {self.memory_key: buffer}
+        return {
+            self.memory_key: get_buffer_string(
+                buffer, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        }
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self._schedule_summary()
+
+    def clear(self) -> None:
+        super().clear()
+        with self._lock:
+            self.summary = ""
+            self.summarized_count = 0
+            self._generation += 1
+
+    def wait(self, timeout=None):
+        """ 実行中の要約があれば完了を待つ (主にテストやバッチ処理用) """
+        with self._lock:
+            future = self._future
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def _schedule_summary(self):
+        """ 上限を超えた古い会話の要約をバックグラウンドで開始する """
+        if self.llm is None:
+            return
+        with self._lock:
+            # 要約中なら次回の save_context に任せる (二重に要約しない)
+            if self._future is not None and not self._future.done():
+                return
+            messages = self.chat_memory.messages
+            start = self.summarized_count
+
+            end = start
+            remaining = count_tokens(messages[start:])
+            # 上限に収まるまで古い会話から順に要約対象にする
+            # 会話の往復 (human, ai) の単位で切り出し、直近の1往復は必ず残す
+            while remaining > self.max_token_limit and end < len(messages) - 2:
+                pair = messages[end:end + 2]
+                remaining -= count_tokens(pair)
+                end += len(pair)
+            if end == start:
+                return
+
+            self._future = _summary_executor.submit(
+                self._summarize, messages[start:end], self.summary, end, self._generation)
+
+    def _summarize(self, messages, existing_summary, end, generation):
+        new_lines = get_buffer_string(
+            messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        chain = SUMMARY_PROMPT | self.llm | StrOutputParser()
+        summary = chain.invoke({"summary": existing_summary, "new_lines": new_lines})
+
+        with self._lock:
+            # 要約中に clear() された場合は結果を捨てる
+            if generation != self._generation:
+                return
+            self.summary = summary
+            self.summarized_count = end
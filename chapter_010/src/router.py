@@ -0,0 +1,222 @@
+# GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_010/src/router.py
+
+import time
+import logging
+import traceback
+
+import tiktoken
+from langchain.agents import create_tool_calling_agent, AgentExecutor
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+logger = logging.getLogger(__name__)
+
+# 1M トークンあたりの料金 (USD) / (input, output)
+# 各社の料金は随時更新されるため、最新の情報は各社のホームページで確認してください
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o": (5.0, 15.0),
+    "claude-3-5-sonnet-20240620": (3.0, 15.0),
+    "gemini-1.5-pro-latest": (3.5, 10.5),
+}
+
+SELF_CHECK_PROMPT = """以下はカスタマーサポートの質問と回答です。
+回答が質問に対して十分かつ正確に答えられているか判定してください。
+
+========
+質問: {input}
+
+回答: {output}
+========
+
+十分に答えられている場合は YES、そうでない・自信がない場合は NO とだけ答えてください。
+"""
+
+_encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+
+
+def get_model_name(llm):
+    """ ChatOpenAI / ChatAnthropic は model_name、ChatGoogleGenerativeAI は model """
+    return getattr(llm, "model_name", None) or getattr(llm, "model", "unknown")
+
+
+def is_same_model(llm, other):
+    """ 同じモデル (インスタンスが別でも、クラスとモデル名が同じ) か """
+    return type(llm) is type(other) and get_model_name(llm) == get_model_name(other)
+
+
+class CostCallbackHandler(BaseCallbackHandler):
+    """
+    LLM 呼び出しのトークン数を集計するコールバック
+
+    ストリーミング時などAPIからトークン数が返ってこない場合は tiktoken で概算する
+    """
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._prompt_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._prompt_tokens = sum(
+            len(_encoding.encode(get_buffer_string(m))) for m in messages)
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            self.input_tokens += usage.get("prompt_tokens", 0)
+            self.output_tokens += usage.get("completion_tokens", 0)
+            return
+        self.input_tokens += self._prompt_tokens
+        for generations in response.generations:
+            for g in generations:
+                self.output_tokens += len(_encoding.encode(g.text))
+
+    def cost(self, model_name):
+        input_price, output_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+        return (self.input_tokens * input_price
+                + self.output_tokens * output_price) / 1_000_000
+
+
+class ModelRouter:
+    """
+    まず速くて安いモデル (fast) で回答し、自信がなさそうな場合のみ
+    強いモデル (strong) に回答させ直すルーター
+
+    以下のいずれかに当てはまる場合に strong へエスカレーションする
+    - `fetch_qa_content` の検索結果が空だった
+    - ツールの実行などでエラーが発生した
+    - 回答が空だった
+    - (self_check=True の場合) fast モデル自身が回答を不十分と判定した
+      (判定にかかった時間と料金も route の合計に含める)
+
+    fast と strong が同じモデルの場合は、回答し直しても変わらないのでエスカレーションしない (判定もしない)
+
+    AgentExecutor と同じように `invoke({'input': ...}, config)` で呼び出せる
+    会話履歴は最終的に採用した回答だけを memory に保存する
+
+    Example:
+    ===============
+    router = ModelRouter(
+        fast_llm=ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo"),
+        strong_llm=ChatOpenAI(temperature=0, model_name="gpt-4o"),
+        tools=tools, prompt=prompt, memory=st.session_state['memory']
+    )
+    response = router.invoke({'input': "法人で契約することはできるの？"})
+    response["route"]  # => {'tier': 'fast', 'escalation_reasons': [], ...}
+    """
+    def __init__(self, fast_llm, strong_llm, tools, prompt, memory,
+                 self_check=False):
+        self.fast_llm = fast_llm
+        self.strong_llm = strong_llm
+        self.tools = tools
+        self.prompt = prompt
+        self.memory = memory
+        self.self_check = self_check
+        self.can_escalate = not is_same_model(fast_llm, strong_llm)
+
+    def _create_executor(self, llm):
+        # memory への保存は router 側でまとめて行うので executor には渡さない
+        agent = create_tool_calling_agent(llm, self.tools, self.prompt)
+        return AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=True,
+            return_intermediate_steps=True
+        )
+
+    def _run_tier(self, tier, llm, inputs, config):
+        """ 1つのモデルでエージェントを実行し、結果と計測値を返す """
+        cost_cb = CostCallbackHandler()
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [cost_cb]
+
+        start = time.perf_counter()
+        error = None
+        try:
+            response = self._create_executor(llm).invoke(inputs, config=config)
+        except Exception:
+            logger.warning("agent failed on %s tier:\n%s", tier, traceback.format_exc())
+            response, error = None, traceback.format_exc()
+
+        return response, error, self._stats(tier, llm, cost_cb, start)
+
+    def _stats(self, tier, llm, cost_cb, start):
+        model_name = get_model_name(llm)
+        return {
+            "tier": tier,
+            "model": model_name,
+            "latency_sec": round(time.perf_counter() - start, 3),
+            "input_tokens": cost_cb.input_tokens,
+            "output_tokens": cost_cb.output_tokens,
+            "cost_usd": round(cost_cb.cost(model_name), 6),
+        }
+
+    def _escalation_reasons(self, response, error):
+        """ エスカレーションすべき理由 (自信のなさのシグナル) を列挙する """
+        if error is not None:
+            return ["error"]
+
+        reasons = []
+        for action, observation in response.get("intermediate_steps", []):
+            if action.tool == "fetch_qa_content" and not observation:
+                reasons.append("empty_qa_result")
+            elif isinstance(observation, str) and observation.startswith("Error"):
+                reasons.append("tool_error")
+        if not response.get("output", "").strip():
+            reasons.append("empty_output")
+        return sorted(set(reasons))
+
+    def _check_answer(self, question, answer):
+        """ fast モデル自身に回答を判定させ、(十分かどうか, 計測値) を返す """
+        cost_cb = CostCallbackHandler()
+        prompt = ChatPromptTemplate.from_messages([("user", SELF_CHECK_PROMPT)])
+        chain = prompt | self.fast_llm | StrOutputParser()
+        start = time.perf_counter()
+        try:
+            verdict = chain.invoke({"input": question, "output": answer},
+                                   config={"callbacks": [cost_cb], "run_name": "self_check"})
+            passed = verdict.strip().upper().startswith("YES")
+        except Exception:
+            logger.warning("self check failed:\n%s", traceback.format_exc())
+            passed = False
+        return passed, self._stats("self_check", self.fast_llm, cost_cb, start)
+
+    def invoke(self, inputs, config=None):
+        inputs = {**inputs, **self.memory.load_memory_variables(inputs)}
+
+        response, error, fast_stats = self._run_tier(
+            "fast", self.fast_llm, inputs, config)
+        reasons = self._escalation_reasons(response, error)
+        tiers = [fast_stats]
+
+        check_stats = None
+        if not reasons and self.self_check and self.can_escalate:
+            passed, check_stats = self._check_answer(inputs["input"], response["output"])
+            if not passed:
+                reasons.append("self_check")
+
+        if reasons and self.can_escalate:
+            response, error, strong_stats = self._run_tier(
+                "strong", self.strong_llm, inputs, config)
+            tiers.append(strong_stats)
+            if error is not None:
+                raise RuntimeError(f"Agent failed on both tiers:\n{error}")
+        elif error is not None:
+            raise RuntimeError(f"Agent failed:\n{error}")
+
+        measured = tiers + ([check_stats] if check_stats else [])
+        route = {
+            "tier": tiers[-1]["tier"],
+            "escalation_reasons": reasons,
+            "tiers": tiers,
+            "self_check": check_stats,
+            "total_latency_sec": round(sum(t["latency_sec"] for t in measured), 3),
+            "total_cost_usd": round(sum(t["cost_usd"] for t in measured), 6),
+        }
+        logger.info("routing decision: %s", route)
+
+        self.memory.save_context(
+            {"input": inputs["input"]}, {"output": response["output"]})
+        return {**response, "route": route}
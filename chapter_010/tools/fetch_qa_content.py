@@ -1,7 +1,7 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_010/tools/fetch_qa_content.py
 
 import streamlit as st
-from langchain_core.tools import tool
+from langchain_core.tools import tool, StructuredTool
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_core.pydantic_v1 import (BaseModel, Field)
@@ -12,7 +12,6 @@ class FetchQAContentInput(BaseModel):
     query: str = Field()
 
 
-@st.cache_resource
 def load_qa_vectorstore(
     vectorstore_path="./vectorstore/qa_vectorstore"
 ):
@@ -25,6 +24,28 @@ def load_qa_vectorstore(
     )
 
 
+@st.cache_resource
+def get_qa_vectorstore():
+    """ Streamlit のアプリでは、読み込んだベクトルDBを全セッションで使い回す """
+    return load_qa_vectorstore()
+
+
+def search_qa_content(db, query):
+    """ ベクトルDBから質問に関連する「よくある質問」を探す """
+    docs = db.similarity_search_with_score(
+        query=query,
+        k=5,
+        score_threshold=0.5
+    )
+    return [
+        {
+            "similarity": 1 - similarity,
+            "content": i.page_content
+        }
+        for i, similarity in docs
+    ]
+
+
 @tool(args_schema=FetchQAContentInput)
 def fetch_qa_content(query):
     """
@@ -48,16 +69,17 @@ def fetch_qa_content(query):
       - similarity: float
       - content: str
     """
-    db = load_qa_vectorstore()
-    docs = db.similarity_search_with_score(
-        query=query,
-        k=5,
-        score_threshold=0.5
+    return search_qa_content(get_qa_vectorstore(), query)
+
+
+def create_fetch_qa_content_tool(db):
+    """
+    読み込み済みのベクトルDBを使う fetch_qa_content を作る
+    (Streamlit を使わない server.py では、ベクトルDBを ResourcePool で保持する)
+    """
+    return StructuredTool.from_function(
+        func=lambda query: search_qa_content(db, query),
+        name=fetch_qa_content.name,
+        description=fetch_qa_content.description,
+        args_schema=FetchQAContentInput,
     )
-    return [
-        {
-            "similarity": 1 - similarity,
-            "content": i.page_content
-        }
-        for i, similarity in docs
-    ]
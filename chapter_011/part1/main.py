@@ -3,7 +3,6 @@
 import re
 import streamlit as st
 from langchain.agents import create_tool_calling_agent, AgentExecutor
-from langchain.memory import ConversationBufferWindowMemory
 from langchain_core.prompts import MessagesPlaceholder, ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig
 from langchain_community.callbacks import StreamlitCallbackHandler
@@ -15,6 +14,7 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 
 # custom tools
 from src.code_interpreter import CodeInterpreterClient
+from src.memory import TokenBudgetMemory
 from tools.code_interpreter import code_interpreter_tool
 
 ###### dotenv を利用しない場合は消してください ######
@@ -69,10 +69,10 @@ def init_page():
         st.session_state.messages = []
 	    # 会話がリセットされる時に Code Interpreter のセッションも作り直す
         st.session_state.code_interpreter_client = CodeInterpreterClient()
-        st.session_state['memory'] = ConversationBufferWindowMemory(
+        st.session_state['memory'] = TokenBudgetMemory(
             return_messages=True,
             memory_key="chat_history",
-            k=10
+            max_token_limit=2000
         )
         st.session_state.custom_system_prompt = load_system_prompt(
             "./prompt/system_prompt.txt")
@@ -106,6 +106,8 @@ def create_agent():
         MessagesPlaceholder(variable_name="agent_scratchpad")
     ])
     llm = select_model()
+    # 古い会話の要約にも選択中のモデルを使う (OpenAI 以外のモデルでは OpenAI の API キーを不要にする)
+    st.session_state['memory'].llm = llm
     agent = create_tool_calling_agent(llm, tools, prompt)
     return AgentExecutor(
         agent=agent,